@@ -1,11 +1,15 @@
+import asyncio
 import datetime
 from datetime import datetime
 import time
 import logging
-from selenium import webdriver
 
 class AlarmManager:
-    def __init__(self, send_resolved_restarts, send_reminder , telegram_client, graph_manager, send_graphs, send_old_resolved, reminder_threshold ,logger=None):
+    # Message kinds that reply to the alarm's latest message
+    REPLY_KINDS = ["reminder", "resolved", "flapping"]
+
+    def __init__(self, send_resolved_restarts, send_reminder , telegram_client, graph_manager, send_graphs, send_old_resolved, reminder_threshold ,
+                 edit_in_place=False, edit_interval=60, flap_detector=None, logger=None):
         self.sent_alarms = {}
         self.send_resolved_restarts = send_resolved_restarts
         self.send_reminder = send_reminder
@@ -15,9 +19,24 @@ class AlarmManager:
         self.send_graphs = send_graphs
         self.send_old_resolved = send_old_resolved
         self.reminder_threshold = reminder_threshold
+        self.graph_worker_pool = None
+        self.outbox = None
+        self.router = None
+        self.edit_in_place = edit_in_place
+        self.edit_interval = edit_interval
+        self.pending_edits = set()
+        # Destination chats whose alert was given up by the outbox, their graph is not waited for
+        self.graph_dropped_chats = {}
+        self.flap_detector = flap_detector
         self.logger = logger if logger else logging.getLogger(__name__)
 
 
+    def restore_state(self, sent_alarms):
+        # Alarm state handed over from the previous active instance
+        self.sent_alarms = sent_alarms
+        self.pending_edits.clear()
+        self.graph_dropped_chats.clear()
+
     def cleanup_sent_alarms(self, retention_period):
         current_time = time.time()
         removed_count = 0
@@ -25,11 +44,18 @@ class AlarmManager:
         for alarm_id in list(self.sent_alarms.keys()):
             if current_time - self.sent_alarms[alarm_id]['last_sent'] > retention_period:
                 del self.sent_alarms[alarm_id]
+                self.pending_edits.discard(alarm_id)
+                self.graph_dropped_chats.pop(alarm_id, None)
                 removed_count += 1
 
         if removed_count > 0:
             self.logger.info(f"Cleanup: Removed {removed_count} old alarms from cache.")
 
+        if self.flap_detector:
+            removed_count = self.flap_detector.cleanup(current_time)
+            if removed_count > 0:
+                self.logger.info(f"Cleanup: Removed {removed_count} idle triggers from flap detection.")
+
     def format_duration(self, seconds):
         # Convert seconds to hours, minutes, and remaining seconds
         hours, remainder = divmod(seconds, 3600)
@@ -58,6 +84,171 @@ class AlarmManager:
         # Format the datetime object to a string in the desired format
         return timestamp.strftime('%Y-%m-%d %H:%M:%S')
 
+    def get_destinations(self, trigger):
+        # Chats an alarm is sent to, the default chat unless routing rules say otherwise
+        if self.router:
+            return self.router.route(trigger)
+        return [self.telegram_client.chat_id]
+
+    async def deliver(self, session, alarm_id, kind, message, message_type, chat_ids=None, reply_to_message_ids=None, graph_job=None, alert_key=None):
+        # Returns {chat_id: message_id} for every destination that accepted the message. With the
+        # outbox the message is only queued and the message IDs are None until on_message_delivered.
+        # alert_key (the lastchange of the alert) tells the alerts of one trigger apart, a message
+        # of an earlier alert that is delivered late must not touch the current one
+        chat_ids = chat_ids or [self.telegram_client.chat_id]
+        reply_to_message_ids = reply_to_message_ids or {}
+
+        if self.outbox:
+            for chat_id in chat_ids:
+                self.outbox.enqueue(alarm_id, kind, message, message_type, chat_id=chat_id, reply_to_message_id=reply_to_message_ids.get(chat_id),
+                                    reply_to_alarm=kind in self.REPLY_KINDS, graph_job=graph_job, alert_key=alert_key)
+            return {chat_id: None for chat_id in chat_ids}
+
+        # Every destination has its own rate budget, so they are sent to concurrently
+        results = await asyncio.gather(*[
+            self.telegram_client.send_message(session, message, message_type=message_type, reply_to_message_id=reply_to_message_ids.get(chat_id), chat_id=chat_id)
+            for chat_id in chat_ids
+        ])
+        message_ids = {}
+        for chat_id, message_sent in zip(chat_ids, results):
+            if message_sent:
+                message_ids[chat_id] = message_sent["message_id"]
+                self.on_message_delivered(alarm_id, kind, message_sent["message_id"], {"chat_id": chat_id, "alert_key": alert_key})
+        if graph_job and message_ids:
+            # Graphs are rendered and uploaded in the background, the next trigger is not kept waiting
+            self.graph_worker_pool.submit(graph_job["trigger"], graph_job["host_id"], alarm_id, message_ids)
+        return message_ids
+
+    def on_message_delivered(self, alarm_id, kind, message_id, payload):
+        chat_id = payload.get("chat_id")
+        alarm = self.sent_alarms.get(alarm_id)
+        if alarm is None or alarm.get("alert_key") != payload.get("alert_key"):
+            # Belongs to an earlier alert of the trigger, which has alerted again since
+            return
+        if kind == "alert":
+            alarm["message_ids"][chat_id] = message_id
+            alarm["alert_message_ids"][chat_id] = message_id
+        elif kind == "resolved":
+            alarm["message_ids"][chat_id] = message_id
+
+        graph_job = payload.get("graph_job")
+        if graph_job:
+            self.submit_graph(alarm_id, graph_job)
+
+    def on_message_dropped(self, alarm_id, kind, payload):
+        alarm = self.sent_alarms.get(alarm_id)
+        graph_job = payload.get("graph_job")
+        if graph_job and alarm is not None and alarm.get("alert_key") == payload.get("alert_key"):
+            self.graph_dropped_chats.setdefault(alarm_id, set()).add(payload.get("chat_id"))
+            self.submit_graph(alarm_id, graph_job)
+
+    def submit_graph(self, alarm_id, graph_job):
+        # The outbox delivers every chat on its own lane. The graph is rendered once, when the
+        # alert has reached (or was given up for) all destination chats, and then uploaded as
+        # a reply to the alert in each of them
+        alarm = self.sent_alarms.get(alarm_id)
+        if alarm is None:
+            return
+        dropped_chats = self.graph_dropped_chats.get(alarm_id, set())
+        if any(chat_id not in alarm["alert_message_ids"] and chat_id not in dropped_chats for chat_id in alarm["chats"]):
+            return
+        self.graph_dropped_chats.pop(alarm_id, None)
+        if alarm["alert_message_ids"]:
+            self.graph_worker_pool.submit(graph_job["trigger"], graph_job["host_id"], alarm_id, dict(alarm["alert_message_ids"]))
+
+    def resolve_reply_to(self, alarm_id, chat_id, alert_key=None):
+        alarm = self.sent_alarms.get(alarm_id)
+        if alarm is None or alarm.get("alert_key") != alert_key:
+            return None
+        return alarm["message_ids"].get(chat_id)
+
+    def format_status(self, alarm, current_time):
+        # Live status block appended to the original alert when it is edited in place
+        if alarm["status"] == "resolved":
+            resolved_at = alarm.get("resolved_at", alarm["last_sent"])
+            status = f"Status: Resolved at {self.convert_unix_to_standard(resolved_at)} after {self.format_duration(resolved_at - alarm['alert_time'])}"
+        else:
+            status = f"Status: Problem continues for {self.format_duration(current_time - alarm['alert_time'])}"
+        if alarm["reminder_count"] > 0:
+            status += f" ({alarm['reminder_count']} reminders)"
+        return f"{alarm['text']}\n\n{status}"
+
+    def queue_status_edit(self, alarm_id):
+        # Edits are coalesced, only the latest state is sent when the alarm's edit interval allows
+        self.pending_edits.add(alarm_id)
+
+    async def flush_status_edits(self, session, current_time):
+        for alarm_id in list(self.pending_edits):
+            alarm = self.sent_alarms.get(alarm_id)
+            if alarm is None or "alert_message_ids" not in alarm:
+                self.pending_edits.discard(alarm_id)
+                continue
+            if not alarm["alert_message_ids"] or current_time - alarm["last_edit"] < self.edit_interval:
+                # Waiting for the alert to be delivered or for the edit interval
+                continue
+
+            status_message = self.format_status(alarm, current_time)
+            alert_message_ids = list(alarm["alert_message_ids"].items())
+            if self.outbox:
+                for chat_id, alert_message_id in alert_message_ids:
+                    self.outbox.enqueue(alarm_id, "edit", status_message, "ALERT", chat_id=chat_id, edit_message_id=alert_message_id)
+                alarm["last_edit"] = current_time
+                self.pending_edits.discard(alarm_id)
+                continue
+
+            results = await asyncio.gather(*[
+                self.telegram_client.edit_message(session, alert_message_id, status_message, message_type="ALERT", chat_id=chat_id)
+                for chat_id, alert_message_id in alert_message_ids
+            ])
+            if all(results):
+                alarm["last_edit"] = current_time
+                self.pending_edits.discard(alarm_id)
+                self.logger.info(f"Updated status of alarm {alarm_id} in place.")
+            else:
+                self.logger.error(f"Failed to update status of alarm {alarm_id} in place.")
+
+    async def is_suppressed_by_flapping(self, session, trigger, alarm_id, host_name, current_time):
+        # A flapping trigger gets one notice when it starts and one summary when it stops,
+        # every transition in between is suppressed
+        flap_event = self.flap_detector.observe(alarm_id, int(trigger['lastchange']), current_time)
+        alarm = self.sent_alarms.get(alarm_id)
+        chat_ids = alarm["chats"] if alarm else self.get_destinations(trigger)
+        reply_ids = alarm["message_ids"] if alarm else None
+        alert_key = alarm.get("alert_key") if alarm else None
+
+        if flap_event == "started":
+            transition_count = self.flap_detector.get_recent_count(alarm_id, current_time)
+            flapping_message = (f"Host '{host_name}': {trigger['description']} changed state {transition_count} times in "
+                                f"{self.format_duration(self.flap_detector.window)}, notifications are suppressed until it settles.")
+            await self.deliver(session, alarm_id, "flapping", flapping_message, "FLAPPING", chat_ids=chat_ids, reply_to_message_ids=reply_ids, alert_key=alert_key)
+            self.logger.alert(f"Trigger {alarm_id} started flapping: {flapping_message}")
+            return True
+
+        if flap_event == "stopped":
+            current_state = "PROBLEM" if trigger.get('value', '1') == '1' else "OK"
+            settled_message = (f"Host '{host_name}': {trigger['description']} stopped flapping in state {current_state}, "
+                               f"{self.flap_detector.get_suppressed_count(alarm_id)} state changes were suppressed.")
+            await self.deliver(session, alarm_id, "flapping", settled_message, "FLAPPING", chat_ids=chat_ids, reply_to_message_ids=reply_ids, alert_key=alert_key)
+            self.logger.info(f"Trigger {alarm_id} stopped flapping: {settled_message}")
+            return False
+
+        if self.flap_detector.is_flapping(alarm_id):
+            self.logger.info(f"Skipping flapping trigger {alarm_id}.")
+            return True
+        return False
+
+    def will_send(self, trigger, trigger_state):
+        # Whether processing the trigger sends a new alert or resolution (which include the host IP),
+        # the same conditions as process_problem_trigger / process_resolved_trigger
+        alarm = self.sent_alarms.get(trigger['triggerid'])
+        if trigger_state == "1":
+            return alarm is None or alarm["status"] == "resolved"
+        if self.is_restart_related(trigger) and not self.send_resolved_restarts:
+            return False
+        if alarm is None:
+            return self.send_old_resolved
+        return alarm["status"] == "problem"
+
     def is_restart_related(self, trigger):
         # Example condition - this is highly dependent on how your triggers are set up
         if 'restart' in trigger['description'].lower():
@@ -72,38 +263,58 @@ class AlarmManager:
                 host_id = host_info.get('hostid', 'default_host_id')  # Provide a default value
                 host_name = host_info.get('host', 'default_host_name')
 
+                if self.flap_detector and await self.is_suppressed_by_flapping(session, trigger, alarm_id, host_name, current_time):
+                    return
+
                 if alarm_id not in self.sent_alarms or self.sent_alarms[alarm_id]["status"] == "resolved":
                     alert_time = self.convert_unix_to_standard(trigger['lastchange'])
                     host_ip = await self.zabbix_client.get_host_ip_by_id(session, host_id)  # Use self to access class method
                     problem_message = f"Alarm Triggered at {alert_time} - Host '{host_name}' ({host_ip}): {trigger['description']}"
 
-                    message_sent = await self.telegram_client.send_message(session, problem_message, message_type="ALERT")
+                    chat_ids = self.get_destinations(trigger)
+                    graph_job = {"trigger": trigger, "host_id": host_id} if self.send_graphs else None
+                    alert_key = int(trigger['lastchange'])
+                    message_sent = await self.deliver(session, alarm_id, "alert", problem_message, "ALERT", chat_ids=chat_ids, graph_job=graph_job, alert_key=alert_key)
                     if message_sent:
+                        # Message IDs are tracked per destination chat for reply threading
                         self.sent_alarms[alarm_id] = {
                             "status": "problem",
-                            "message_id": message_sent["message_id"],
+                            "alert_key": alert_key,
+                            "chats": chat_ids,
+                            "message_ids": {chat_id: message_id for chat_id, message_id in message_sent.items() if message_id},
                             "last_sent": current_time,
                             "last_remind": current_time,  # Add a last_reminder key with the current time to track when the last reminder was sent
-                            "host_ip": host_ip
+                            "host_ip": host_ip,
+                            # Kept for editing the original alert in place
+                            "alert_message_ids": {chat_id: message_id for chat_id, message_id in message_sent.items() if message_id},
+                            "text": problem_message,
+                            "alert_time": int(trigger['lastchange']),
+                            "reminder_count": 0,
+                            "last_edit": current_time
                         }
-                        self.logger.alert(f"Sent Problem Alert: {problem_message}")
-                        
-                        if self.send_graphs:
-                            await self.graph_manager.process_graphs(session, trigger, host_id, alarm_id, reply_id = self.sent_alarms[alarm_id]["message_id"])  #!!!!!
+                        self.logger.alert(f"{'Queued' if self.outbox else 'Sent'} Problem Alert: {problem_message}")
 
                     else:
                         self.logger.error(f"Failed to send Problem Alert: {problem_message}")
                 else:
                     if self.sent_alarms[alarm_id]["status"] == "problem" and current_time - self.sent_alarms[alarm_id]["last_remind"] > self.reminder_threshold:
-                        if self.send_reminder:
-                            reply_id = self.sent_alarms[alarm_id]["message_id"]
+                        if self.send_reminder and self.edit_in_place:
+                            # The reminder only updates the status block of the original alert
+                            self.sent_alarms[alarm_id]["last_remind"] = current_time
+                            self.sent_alarms[alarm_id]["reminder_count"] += 1
+                            self.queue_status_edit(alarm_id)
+                            self.logger.alert(f"Queued in-place reminder for alarm {alarm_id}.")
+                        elif self.send_reminder:
+                            reply_ids = self.sent_alarms[alarm_id]["message_ids"]
                             
                             reminder_message = f"Problem Continues for {self.format_duration(current_time - self.sent_alarms[alarm_id]['last_sent'])}"
-                            message_sent = await self.telegram_client.send_message(session, reminder_message, message_type="REMINDER", reply_to_message_id=reply_id)
+                            message_sent = await self.deliver(session, alarm_id, "reminder", reminder_message, "REMINDER",
+                                                              chat_ids=self.sent_alarms[alarm_id]["chats"], reply_to_message_ids=reply_ids,
+                                                              alert_key=self.sent_alarms[alarm_id].get("alert_key"))
                                                                                  
                             if message_sent:                                
                                 self.sent_alarms[alarm_id]["last_remind"] = current_time
-                                self.logger.alert(f"Sent Problem Reminder: {reminder_message}")                           
+                                self.logger.alert(f"{'Queued' if self.outbox else 'Sent'} Problem Reminder: {reminder_message}")                           
                             
                             else:
                                 self.logger.error(f"Failed to send Problem Reminder: {reminder_message}")
@@ -115,7 +326,7 @@ class AlarmManager:
         except Exception as e:
                 error_message = f"Error in process_problem_trigger : {e}"
                 self.logger.error(error_message)
-                await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+                await self.deliver(session, None, "error", error_message, "ERROR")
         
     async def process_resolved_trigger(self, session, trigger, current_time):
         try:
@@ -126,19 +337,26 @@ class AlarmManager:
             if 'hosts' in trigger and trigger['hosts'] and 'host' in trigger['hosts'][0] and 'hostid' in trigger['hosts'][0]:
                 host_id = trigger['hosts'][0]['hostid']
                 host_name = trigger['hosts'][0]['host']
+                if self.flap_detector and await self.is_suppressed_by_flapping(session, trigger, alarm_id, host_name, current_time):
+                    return
                 alert_time = self.convert_unix_to_standard(trigger['lastchange'])
                 if alarm_id in self.sent_alarms and self.sent_alarms[alarm_id]["status"] == "problem":
                     host_ip = await self.zabbix_client.get_host_ip_by_id(session, host_id)  # Use self to access class method
                     resolved_message = f"Problem Resolved at {alert_time} - Host '{host_name}' ({host_ip}): {trigger['description']}"
-                    reply_id = self.sent_alarms[alarm_id]["message_id"]
-                    if reply_id:
-                        message_sent = await self.telegram_client.send_message(session, resolved_message, message_type="RESOLVED", reply_to_message_id=reply_id)
-                        message_id = message_sent.get("message_id", None)
-                        if message_id:
+                    reply_ids = self.sent_alarms[alarm_id]["message_ids"]
+                    # With the outbox the alert may still be undelivered, the reply is resolved on delivery
+                    if reply_ids or self.outbox:
+                        message_sent = await self.deliver(session, alarm_id, "resolved", resolved_message, "RESOLVED",
+                                                          chat_ids=self.sent_alarms[alarm_id]["chats"], reply_to_message_ids=reply_ids,
+                                                          alert_key=self.sent_alarms[alarm_id].get("alert_key"))
+                        if message_sent:
                             self.sent_alarms[alarm_id]["status"] = "resolved"
-                            self.sent_alarms[alarm_id]["message_id"] = message_sent["message_id"]
+                            self.sent_alarms[alarm_id]["message_ids"].update({chat_id: message_id for chat_id, message_id in message_sent.items() if message_id})
                             self.sent_alarms[alarm_id]["last_sent"] = current_time
-                            self.logger.resolved(f"Sent Resolved Alert as a reply: {resolved_message}")
+                            if self.edit_in_place and "alert_message_ids" in self.sent_alarms[alarm_id]:
+                                self.sent_alarms[alarm_id]["resolved_at"] = int(trigger['lastchange'])
+                                self.queue_status_edit(alarm_id)
+                            self.logger.resolved(f"{'Queued' if self.outbox else 'Sent'} Resolved Alert as a reply: {resolved_message}")
                         else:
                             self.logger.error(f"Failed to send Resolved Alert as a reply: {resolved_message}")
                 elif alarm_id not in self.sent_alarms:
@@ -148,29 +366,32 @@ class AlarmManager:
                     self.logger.info(f"Resolved alarm {alarm_id} was not previously tracked. Sending new message.")
                     host_ip = await self.zabbix_client.get_host_ip_by_id(session, host_id)  # Use self to access class method
                     resolved_message = f"Problem Resolved at {alert_time} - Host '{host_name}' ({host_ip}): {trigger['description']}"
-                    message_sent = await self.telegram_client.send_message(session, resolved_message, message_type="RESOLVED")
-                    message_id = message_sent.get("message_id", None)
-                    if message_id:
+                    chat_ids = self.get_destinations(trigger)
+                    alert_key = int(trigger['lastchange'])
+                    message_sent = await self.deliver(session, alarm_id, "resolved", resolved_message, "RESOLVED", chat_ids=chat_ids, alert_key=alert_key)
+                    if message_sent:
                         self.sent_alarms[alarm_id] = {
                             "status": "resolved",
-                            "message_id": message_id,
+                            "alert_key": alert_key,
+                            "chats": chat_ids,
+                            "message_ids": {chat_id: message_id for chat_id, message_id in message_sent.items() if message_id},
                             "last_sent": current_time,
                             "last_remind": current_time,  # Also add the last_sent time
                             "host_ip": host_ip
                         }
-                        self.logger.resolved(f"Sent Resolved message as new: {resolved_message}")
+                        self.logger.resolved(f"{'Queued' if self.outbox else 'Sent'} Resolved message as new: {resolved_message}")
                     else:
                         self.logger.error(f"Failed to send Resolved message as new: {resolved_message}")
                 else:
                     self.logger.info(f"Skipping already sent resolved {alarm_id}.")
             else:
                 error_message = f"Missing 'host' or 'hostid' key in trigger data for alarm_id {alarm_id}: {trigger}"
-                self.telegram_client.send_message(session, error_message, message_type="ERROR")
+                await self.deliver(session, None, "error", error_message, "ERROR")
                 return
         except Exception as e:
                 error_message = f"Error in process_resolved_trigger : {e}"
                 self.logger.error(error_message)
-                await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+                await self.deliver(session, None, "error", error_message, "ERROR")
         
     
         
\ No newline at end of file
@@ -0,0 +1,58 @@
+import logging
+import re
+
+class AlarmRouter:
+    # Trigger selects needed by the rule conditions, added to trigger.get only when used
+    GROUP_SELECT = {"selectHostGroups": ["name"]}
+    TAG_SELECT = {"selectTags": "extend"}
+
+    def __init__(self, rules, default_chat_id, logger=None):
+        self.default_chat_id = default_chat_id
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.rules = []
+        for rule in rules:
+            self.rules.append(dict(rule, pattern=re.compile(rule["pattern"]) if rule.get("pattern") else None))
+
+    def get_trigger_selects(self):
+        selects = {}
+        if any(rule.get("groups") for rule in self.rules):
+            selects.update(self.GROUP_SELECT)
+        if any(rule.get("tags") for rule in self.rules):
+            selects.update(self.TAG_SELECT)
+        return selects
+
+    def matches(self, rule, trigger):
+        # Every condition of a rule has to match, a rule without conditions matches everything
+        if rule.get("min_severity") is not None and int(trigger.get('priority', 0)) < rule["min_severity"]:
+            return False
+
+        if rule.get("groups"):
+            # hostgroups since Zabbix 6.2, groups before
+            group_names = {group.get('name') for group in trigger.get('hostgroups', trigger.get('groups', []))}
+            if not group_names & set(rule["groups"]):
+                return False
+
+        if rule.get("tags"):
+            trigger_tags = {(tag.get('tag'), tag.get('value')) for tag in trigger.get('tags', [])}
+            trigger_tag_names = {tag for tag, _ in trigger_tags}
+            for tag, value in rule["tags"]:
+                # A tag without a value matches the tag with any value
+                if value is None and tag not in trigger_tag_names:
+                    return False
+                if value is not None and (tag, value) not in trigger_tags:
+                    return False
+
+        if rule["pattern"] is not None and not rule["pattern"].search(trigger.get('description', '')):
+            return False
+
+        return True
+
+    def route(self, trigger):
+        # Union of the chats of all matching rules, in rule order; the default chat if none match
+        chat_ids = []
+        for rule in self.rules:
+            if self.matches(rule, trigger):
+                chat_ids.extend(chat_id for chat_id in rule["chats"] if chat_id not in chat_ids)
+        if not chat_ids:
+            return [self.default_chat_id]
+        return chat_ids
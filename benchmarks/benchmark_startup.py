@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Startup regression check: times the import of the application in fresh interpreters and
+# verifies that Selenium is not loaded at import time (it is only needed for the web login).
+# Run from the repository root: python benchmarks/benchmark_startup.py [max_seconds] [runs]
+# Exits with status 1 when the median import time is above max_seconds or Selenium is imported.
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "print(time.perf_counter() - started)\n"
+    "print(any(name == 'selenium' or name.startswith('selenium.') for name in sys.modules))\n"
+)
+
+
+def measure():
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{result.stderr}")
+    import_time, selenium_loaded = result.stdout.split()
+    return float(import_time), selenium_loaded == "True"
+
+
+def main():
+    max_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    timings = []
+    selenium_loaded = False
+    for _ in range(runs):
+        import_time, loaded = measure()
+        timings.append(import_time)
+        selenium_loaded = selenium_loaded or loaded
+
+    median = statistics.median(timings)
+    print(f"Import of main: median {median * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms over {runs} runs (limit {max_seconds * 1000:.0f} ms)")
+    failed = False
+    if selenium_loaded:
+        print("FAIL: selenium is imported at startup")
+        failed = True
+    if median > max_seconds:
+        print("FAIL: startup import time is above the limit")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
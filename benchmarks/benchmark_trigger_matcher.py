@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Times TriggerMatcher on a synthetic installation: 50k trigger descriptions against 500 filters.
+# Run from the repository root: python benchmarks/benchmark_trigger_matcher.py [triggers] [filters]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trigger_matcher import TriggerMatcher
+
+WORDS = ["disk", "space", "memory", "usage", "over", "limits", "cpu", "load", "interface", "down", "ping", "loss",
+         "agent", "unreachable", "service", "restarted", "datastore", "lun", "latency", "high", "low", "free", "swap"]
+MACROS = ["{HOST.NAME}", "{ITEM.VALUE}", "{ITEM.LASTVALUE1}", "{$THRESHOLD}"]
+
+
+def phrase(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def make_filters(rng, count):
+    # Equal thirds: literal prefix with macros, leading macro, and macros at both ends
+    filters = []
+    for index in range(count):
+        literal = f"{phrase(rng, 3)} {index}"
+        shape = index % 3
+        if shape == 0:
+            description = f"{literal} on {rng.choice(MACROS)}"
+        elif shape == 1:
+            description = f"{rng.choice(MACROS)} {literal}"
+        else:
+            description = f"{rng.choice(MACROS)} {literal} is {rng.choice(MACROS)}"
+        filters.append({"description": description})
+    return filters
+
+
+def make_descriptions(rng, filters, count):
+    # About one description in ten matches a filter, the rest look alike but do not
+    descriptions = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            description = rng.choice(filters)["description"]
+            for macro in MACROS:
+                description = description.replace(macro, f"host-{rng.randint(1, 9999)}")
+        else:
+            description = f"host-{rng.randint(1, 9999)} {phrase(rng, 4)} {rng.randint(0, 100)}%"
+        descriptions.append({"description": description})
+    return descriptions
+
+
+def main():
+    trigger_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    filter_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(42)
+    filters = make_filters(rng, filter_count)
+    triggers = make_descriptions(rng, filters, trigger_count)
+
+    started = time.perf_counter()
+    matcher = TriggerMatcher(filters)
+    compile_time = time.perf_counter() - started
+
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        matched = sum(1 for _ in matcher.filter_triggers(triggers))
+        timings.append(time.perf_counter() - started)
+
+    print(f"{trigger_count} triggers x {filter_count} filters: compile {compile_time * 1000:.1f} ms, "
+          f"match {min(timings) * 1000:.1f} ms (best of 3), {matched} matched")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,120 @@
 import configparser
+import os
+import re
 
 class ConfigManager:
+    REQUIRED_SECTIONS = ['Settings', 'GraphSettings', 'TriggerFilters']
+    REQUIRED_SETTINGS = ['API_URL', 'API_USER', 'API_PASSWORD', 'BOT_TOKEN', 'CHAT_ID']
+    INTEGER_SETTINGS = ['LOGIN_RETRY_INTERVAL', 'MAIN_LOOP_SLEEP_DURATION', 'CLEANUP_INTERVAL', 'MAX_LOGIN_RETRIES', 'LOGIN_RETRY_DELAY',
+                        'RETENTION_PERIOD', 'RESEND_THRESHOLD', 'REMINDER_THRESHOLD', 'MIN_SEVERITY', 'DURATION_THRESHOLD',
+                        'STARTUP_TIME_TARGET', 'EDIT_INTERVAL',
+                        'FLAP_WINDOW', 'FLAP_START_THRESHOLD', 'FLAP_STOP_THRESHOLD',
+                        'LOOP_LAG_THRESHOLD', 'SLOW_CALLBACK_THRESHOLD', 'PROFILE_CYCLES',
+                        'OUTBOX_MAX_ATTEMPTS', 'CHAT_MESSAGE_INTERVAL', 'TRIGGER_PAGE_SIZE',
+                        'HA_LEASE_TTL']
+    ROUTING_CONDITIONS = ['chats', 'min_severity', 'groups', 'tags', 'pattern']
+    INTEGER_GRAPH_SETTINGS = ['WIDTH', 'HEIGTH', 'MIN_PERIOD', 'MAX_PERIOD', 'GRAPH_WORKERS', 'GRAPH_QUEUE_SIZE', 'GRAPH_JOB_DEADLINE']
+
     def __init__(self, config_file):
-        self.config = configparser.ConfigParser()
-        self.config.read(config_file)
+        self.config_file = config_file
+        self.last_modified = self.get_last_modified()
+        self.config = self.load()
+        self.previous_config = None
+
+    def load(self):
+        # Parse into a fresh parser so a broken file never replaces a working config
+        config = configparser.ConfigParser()
+        try:
+            config.read(self.config_file)
+        except configparser.Error as e:
+            # Syntax errors (duplicate keys, lines outside a section...) are reported like invalid settings
+            raise ValueError(f"Cannot parse {self.config_file}: {e}")
+        self.validate(config)
+        return config
+
+    def validate(self, config):
+        for section in self.REQUIRED_SECTIONS:
+            if section not in config:
+                raise ValueError(f"Missing [{section}] section in {self.config_file}")
+
+        for key in self.REQUIRED_SETTINGS:
+            if not config['Settings'].get(key, '').strip():
+                raise ValueError(f"Missing required setting {key} in [Settings]")
+
+        for section, keys in (('Settings', self.INTEGER_SETTINGS), ('GraphSettings', self.INTEGER_GRAPH_SETTINGS)):
+            for key in keys:
+                if key in config[section]:
+                    try:
+                        int(config[section][key])
+                    except ValueError:
+                        raise ValueError(f"Setting {key} in [{section}] must be an integer, got '{config[section][key]}'")
+
+        renderer = config['GraphSettings'].get('GRAPH_RENDERER', 'frontend').strip().lower()
+        if renderer not in ('frontend', 'native'):
+            raise ValueError(f"Setting GRAPH_RENDERER in [GraphSettings] must be frontend or native, got '{renderer}'")
+
+        if 'Routing' in config:
+            for name in config['Routing']:
+                self.parse_routing_rule(name, config['Routing'][name])
+
+    def parse_routing_rule(self, name, value):
+        # chats: -1001, -1002; min_severity: 4; groups: Databases; tags: scope=availability, team; pattern: (?i)disk
+        rule = {"name": name, "chats": [], "min_severity": None, "groups": [], "tags": [], "pattern": None}
+        for condition in value.split(';'):
+            if not condition.strip():
+                continue
+            key, separator, argument = condition.partition(':')
+            key = key.strip().lower()
+            argument = argument.strip()
+            if not separator or key not in self.ROUTING_CONDITIONS:
+                raise ValueError(f"Routing rule {name}: unknown condition '{condition.strip()}', expected one of {', '.join(self.ROUTING_CONDITIONS)}")
+
+            if key == 'min_severity':
+                try:
+                    rule[key] = int(argument)
+                except ValueError:
+                    raise ValueError(f"Routing rule {name}: min_severity must be an integer, got '{argument}'")
+            elif key == 'tags':
+                for tag in argument.split(','):
+                    tag_name, has_value, tag_value = tag.partition('=')
+                    if tag_name.strip():
+                        rule[key].append((tag_name.strip(), tag_value.strip() if has_value else None))
+            elif key == 'pattern':
+                try:
+                    re.compile(argument)
+                except re.error as e:
+                    raise ValueError(f"Routing rule {name}: invalid pattern '{argument}': {e}")
+                rule[key] = argument
+            else:
+                rule[key] = [item.strip() for item in argument.split(',') if item.strip()]
+
+        if not rule["chats"]:
+            raise ValueError(f"Routing rule {name} has no chats")
+        return rule
+
+    def get_last_modified(self):
+        try:
+            return os.path.getmtime(self.config_file)
+        except OSError:
+            return None
+
+    def has_changed_on_disk(self):
+        return self.get_last_modified() != self.last_modified
+
+    def reload(self):
+        # Raises ValueError and keeps the current config if the new file is invalid.
+        # The file is marked as seen either way, so a broken edit is reported once, not every cycle
+        self.last_modified = self.get_last_modified()
+        self.previous_config = None
+        config = self.load()
+        self.previous_config = self.config
+        self.config = config
+
+    def rollback(self):
+        # Back to the config before the last reload, when its settings could not be applied
+        if self.previous_config is not None:
+            self.config = self.previous_config
+            self.previous_config = None
 
     def get_settings(self):
         return self.config['Settings']
@@ -14,6 +125,12 @@ class ConfigManager:
         for key in section:
             trigger_filters.append({"description": section[key]})
         return trigger_filters
-    
+
+    def get_routing_rules(self):
+        if 'Routing' not in self.config:
+            return []
+        section = self.config['Routing']
+        return [self.parse_routing_rule(name, section[name]) for name in section]
+
     def get_graph_settings(self):
         return self.config['GraphSettings']
\ No newline at end of file
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.5, lag_threshold=0.25, logger=None):
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.task = None
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        # The loop is late by as much as a callback blocked it
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.lag_threshold:
+                self.logger.warning(f"Event loop lag of {lag * 1000:.0f} ms detected.")
+
+    def format_stats(self):
+        average_lag = self.total_lag / self.samples if self.samples else 0.0
+        return f"Event loop lag: avg {average_lag * 1000:.1f} ms / max {self.max_lag * 1000:.1f} ms over {self.samples} samples"
+
+
+class SamplingProfiler:
+    # Samples the event loop thread from a helper thread and writes folded stacks,
+    # the input format of flamegraph.pl and speedscope
+    def __init__(self, output_directory, interval=0.005, logger=None):
+        self.output_directory = output_directory
+        self.interval = interval
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.target_thread_id = None
+        self.stacks = Counter()
+        self.thread = None
+        self.stop_event = threading.Event()
+        # Sampling pauses while the main loop sleeps between cycles
+        self.active = False
+
+    def start(self):
+        self.target_thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.active = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.sample, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while not self.stop_event.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+        file_name = os.path.join(self.output_directory, f"profile_{int(time.time())}.folded")
+        with open(file_name, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return file_name
+
+
+class Diagnostics:
+    def __init__(self, output_directory, lag_threshold=0.25, slow_callback_duration=0.1, profile_cycles=3, logger=None):
+        self.output_directory = output_directory
+        self.lag_threshold = lag_threshold
+        self.slow_callback_duration = slow_callback_duration
+        self.profile_cycles = profile_cycles
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.lag_monitor = None
+        self.profiler = None
+        self.cycles_to_profile = 0
+        self.profile_requested = False
+
+    def toggle_monitoring(self):
+        # Lag sampling and asyncio's slow callback warnings are off unless switched on
+        loop = asyncio.get_running_loop()
+        if self.lag_monitor is None:
+            self.lag_monitor = LoopLagMonitor(lag_threshold=self.lag_threshold, logger=self.logger)
+            self.lag_monitor.start()
+            loop.slow_callback_duration = self.slow_callback_duration
+            loop.set_debug(True)
+            # asyncio reports slow callbacks on its own logger, send them to the same log outputs
+            for handler in self.logger.handlers:
+                logging.getLogger('asyncio').addHandler(handler)
+            self.logger.info(f"Diagnostics on: event loop lag monitor and slow callback reporting (> {self.slow_callback_duration}s).")
+        else:
+            self.logger.info(self.lag_monitor.format_stats())
+            self.lag_monitor.stop()
+            self.lag_monitor = None
+            loop.set_debug(False)
+            for handler in self.logger.handlers:
+                logging.getLogger('asyncio').removeHandler(handler)
+            self.logger.info("Diagnostics off.")
+
+    def request_profile(self):
+        self.profile_requested = True
+        self.logger.info(f"Profiling of the next {self.profile_cycles} cycles requested.")
+
+    def cycle_started(self):
+        if self.profiler is not None:
+            self.profiler.active = True
+        elif self.profile_requested:
+            self.profile_requested = False
+            self.cycles_to_profile = self.profile_cycles
+            self.profiler = SamplingProfiler(self.output_directory, logger=self.logger)
+            self.profiler.start()
+
+    def cycle_finished(self):
+        if self.lag_monitor is not None:
+            self.logger.info(self.lag_monitor.format_stats())
+
+        if self.profiler is not None:
+            self.profiler.active = False
+            self.cycles_to_profile -= 1
+            if self.cycles_to_profile <= 0:
+                file_name = self.profiler.stop()
+                self.profiler = None
+                self.logger.info(f"Profile of {self.profile_cycles} cycles written to {file_name}.")
@@ -0,0 +1,78 @@
+from array import array
+
+class FlapState:
+    # Slots keep the per-trigger overhead small with many triggers
+    __slots__ = ('transitions', 'head', 'last_change', 'flapping', 'suppressed')
+
+    def __init__(self, size):
+        # Ring buffer of the last transition timestamps, 4 bytes each
+        self.transitions = array('I', bytes(4 * size))
+        self.head = 0
+        self.last_change = None
+        self.flapping = False
+        self.suppressed = 0
+
+
+class FlapDetector:
+    def __init__(self, window=900, start_threshold=5, stop_threshold=2):
+        self.window = window
+        self.start_threshold = start_threshold
+        self.stop_threshold = stop_threshold
+        self.states = {}
+
+    def count_recent(self, state, current_time):
+        since = current_time - self.window
+        return sum(1 for timestamp in state.transitions if timestamp and timestamp >= since)
+
+    def observe(self, trigger_id, lastchange, current_time):
+        # Returns "started" or "stopped" when the trigger enters or leaves the flapping state
+        state = self.states.get(trigger_id)
+        if state is None:
+            state = self.states[trigger_id] = FlapState(self.start_threshold)
+        elif len(state.transitions) != self.start_threshold:
+            # The threshold was reloaded, resize the ring buffer keeping the newest transitions
+            newest = sorted(state.transitions)[-self.start_threshold:]
+            state.transitions = array('I', bytes(4 * self.start_threshold))
+            state.transitions[:len(newest)] = array('I', newest)
+            state.head = len(newest) % self.start_threshold
+
+        if lastchange != state.last_change:
+            state.last_change = lastchange
+            state.transitions[state.head] = lastchange
+            state.head = (state.head + 1) % len(state.transitions)
+            if state.flapping:
+                state.suppressed += 1
+
+        # Hysteresis: start at start_threshold transitions in the window, stop only at stop_threshold
+        recent = self.count_recent(state, current_time)
+        if not state.flapping and recent >= self.start_threshold:
+            state.flapping = True
+            state.suppressed = 0
+            return "started"
+        if state.flapping and recent <= self.stop_threshold:
+            state.flapping = False
+            return "stopped"
+        return None
+
+    def is_flapping(self, trigger_id):
+        state = self.states.get(trigger_id)
+        return state is not None and state.flapping
+
+    def get_recent_count(self, trigger_id, current_time):
+        state = self.states.get(trigger_id)
+        return self.count_recent(state, current_time) if state else 0
+
+    def get_suppressed_count(self, trigger_id):
+        state = self.states.get(trigger_id)
+        return state.suppressed if state else 0
+
+    def cleanup(self, current_time):
+        # Triggers without transitions in the window carry no information anymore
+        since = current_time - self.window
+        removed_count = 0
+        for trigger_id in list(self.states.keys()):
+            state = self.states[trigger_id]
+            if not state.flapping and (state.last_change or 0) < since:
+                del self.states[trigger_id]
+                removed_count += 1
+        return removed_count
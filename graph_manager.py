@@ -1,8 +1,10 @@
+import asyncio
 import time
-from selenium import webdriver
+import uuid
+from graph_renderer import NativeGraphRenderer
 
 class GraphManager:
-    def __init__(self, api_url, base_url, telegram_client, zabbix_client, width, height, logger):
+    def __init__(self, api_url, base_url, telegram_client, zabbix_client, width, height, logger, min_period=3600, max_period=604800, renderer="frontend"):
         self.session_cookie = None
         self.api_url = api_url
         self.base_url = base_url
@@ -10,6 +12,11 @@ class GraphManager:
         self.zabbix_client = zabbix_client
         self.width = width
         self.height = height
+        self.min_period = min_period
+        self.max_period = max_period
+        # "frontend" downloads chart.php with a browser session, "native" draws from history.get
+        self.renderer = renderer
+        self.native_renderer = NativeGraphRenderer(logger=logger)
         self.token = None
         self.logger = logger
 
@@ -23,6 +30,9 @@ class GraphManager:
     def set_token(self, token):
         self.token = token
 
+    def needs_web_session(self):
+        return self.renderer != "native"
+
 
     def is_related_to(self, trigger, keywords):
         # Check if any of the keywords are in the trigger's description
@@ -64,15 +74,22 @@ class GraphManager:
         return None
     
     
-    async def fetch_graph_image(self, session, itemid):
+    def get_graph_period(self, trigger):
+        # Show the problem and about as much time before it, within the configured bounds
+        problem_age = int(time.time()) - int(trigger.get('lastchange', 0))
+        return max(self.min_period, min(self.max_period, problem_age * 2))
+
+    async def fetch_graph_image(self, session, itemids, period=3600):
         # Replace with your Zabbix frontend URL
         # Note that URL parameters are now using relative time strings and are URL-encoded
-        graph_url = f"{self.base_url}/zabbix/chart.php?from=now-1h&to=now&itemids%5B0%5D={itemid}&width={self.width}&height={self.height}&type=0"
+        # Several items are drawn on a single chart
+        item_params = "&".join(f"itemids%5B{index}%5D={itemid}" for index, itemid in enumerate(itemids))
+        graph_url = f"{self.base_url}/zabbix/chart.php?from=now-{period}s&to=now&{item_params}&width={self.width}&height={self.height}&type=0"
         cookies = {'zbx_session': self.session_cookie}
 
-        # Generate a unique file name
+        # Generate a unique file name, graphs of two alarms on the same items can be rendered in the same second
         timestamp = int(time.time())
-        file_name = f"item_graph_{itemid}_{timestamp}.png"
+        file_name = f"item_graph_{'_'.join(str(itemid) for itemid in itemids)}_{timestamp}_{uuid.uuid4().hex[:8]}.png"
 
         try:
             async with session.get(graph_url, cookies=cookies) as response:
@@ -83,7 +100,7 @@ class GraphManager:
                         f.write(graph_image)
                     return file_name
                 else:
-                    error_message = f"Failed to fetch item graph image for itemid: {itemid}, Status: {response.status}"
+                    error_message = f"Failed to fetch item graph image for itemids: {itemids}, Status: {response.status}"
                     self.logger.error(error_message)
                     await self.telegram_client.send_message(session, error_message, message_type="ERROR")
                     return None
@@ -92,78 +109,102 @@ class GraphManager:
             self.logger.error(error_message)
             await self.telegram_client.send_message(session, error_message, message_type="ERROR")
             return None
-        
 
-    async def process_graphs(self, session, trigger, host_id, alarm_id, reply_id):
+    async def render_graph_image(self, session, itemids, period=3600, title=""):
+        try:
+            return await self.native_renderer.render(session, self.api_url, self.token, itemids, period, self.width, self.height, title)
+        except Exception as e:
+            # Also covers numpy / matplotlib not being installed
+            error_message = f"Error rendering item graph image: {e!r}"
+            self.logger.error(error_message)
+            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            return None
+
+    async def find_disk_item_id(self, session, trigger, host_id):
+        # Tokenize the trigger description
+        trigger_tokens = trigger['description'].lower().split()
+
+        # Fetch all items for the host
+        all_items = await self.zabbix_client.get_all_items(session, host_id)
+
+        # Initialize variables to store the best matching item and its score
+        best_matching_item_id = None
+        best_matching_score = 0
+
+        for item in all_items:
+            if "percentage" in item['name'].strip().lower():
+                item_name_tokens = item['name'].lower().split()
+
+                # Calculate the relevance score (count of common tokens)
+                score = len(set(trigger_tokens) & set(item_name_tokens))
+
+                # Check if the current item has a higher score
+                if score > best_matching_score:
+                    best_matching_item_id = item['itemid']
+                    best_matching_score = score
+
+        return best_matching_item_id
+
+    async def process_graphs(self, session, trigger, host_id, alarm_id, targets):
+        # targets: {chat_id: message_id of the alert}, the graph is rendered once for all of them
+        # Collect every related item first so they are rendered and uploaded as one composite graph
+        item_ids = []
+        graph_types = []
+
         memory_keywords = ['memory usage', 'ram', 'out of memory']
         if self.is_related_to(trigger, memory_keywords):
-            item_id = await self.zabbix_client.get_item_id(session, host_id, "Memory Usage(%)")                        
-            response = await self.fetch_graph_image(session, item_id)
-            if response is not None:
-                result = await self.telegram_client.send_graph_image(session, response,reply_to_message_id=reply_id)
-                if result:
-                    self.logger.info(f"Sent graph image for alarm {alarm_id}")
-                else:
-                    error_message = f"Failed to send graph image for MEMORY alarm {alarm_id}"
-                    self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            item_id = await self.zabbix_client.get_item_id(session, host_id, "Memory Usage(%)")
+            if item_id:
+                item_ids.append(item_id)
+                graph_types.append("MEMORY")
             else:
-                error_message = f"Failed to retrieve graph image for MEMORY alarm {alarm_id}"
-                self.telegram_client.send_message(session, error_message, message_type="ERROR")
+                error_message = f"Failed to retrieve graph item for MEMORY alarm {alarm_id}"
+                await self.telegram_client.send_message(session, error_message, message_type="ERROR")
 
         cpu_keywords = ['processor', 'cpu usage', 'process']
         if self.is_related_to(trigger, cpu_keywords):
             item_id = await self.get_graph_id(session, host_id, "CPU Utilization(Percent)")
-            response = await self.fetch_graph_image(session, item_id)                        
-            if response is not None:
-                result = await self.telegram_client.send_graph_image(session, response,reply_to_message_id=reply_id)
-                if result:
-                    self.logger.info(f"Sent graph image for alarm {alarm_id}")
-                else:
-                    error_message = f"Failed to send graph image for CPU alarm {alarm_id}"
-                    self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            if item_id:
+                item_ids.append(item_id)
+                graph_types.append("CPU")
             else:
-                error_message = f"Failed to retrieve graph image for CPU alarm {alarm_id}"
-                self.telegram_client.send_message(session, error_message, message_type="ERROR")
+                error_message = f"Failed to retrieve graph item for CPU alarm {alarm_id}"
+                await self.telegram_client.send_message(session, error_message, message_type="ERROR")
 
         disk_keywords = ['space', 'datastore', 'lun']
         if self.is_related_to(trigger, disk_keywords):
-            # Tokenize the trigger description
-            trigger_tokens = trigger['description'].lower().split()
-
-            # Fetch all items for the host
-            all_items = await self.zabbix_client.get_all_items(session, host_id)
-
-            # Initialize variables to store the best matching item and its score
-            best_matching_item_id = None
-            best_matching_score = 0
-
-            for item in all_items:
-                if "percentage" in item['name'].strip().lower():
-                    item_name_tokens = item['name'].lower().split()
-
-                    # Calculate the relevance score (count of common tokens)
-                    score = len(set(trigger_tokens) & set(item_name_tokens))
-
-                    # Check if the current item has a higher score
-                    if score > best_matching_score:
-                        best_matching_item_id = item['itemid']
-                        best_matching_score = score
-
-            # If a matching item is found, fetch and send the graph image
-            if best_matching_item_id:
-                response = await self.fetch_graph_image(session, best_matching_item_id)
-                if response is not None:
-                    result = await self.telegram_client.send_graph_image(session, response, reply_to_message_id=reply_id)
-                    if result:
-                        self.logger.info(f"Sent graph image for disk alarm {alarm_id}")
-                    else:
-                        error_message = f"Failed to send graph image for disk alarm {alarm_id}"
-                        await self.telegram_client.send_message(session, error_message, message_type="ERROR")
-                else:
-                    error_message = f"Failed to retrieve graph image for disk alarm {alarm_id}"
-                    await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            item_id = await self.find_disk_item_id(session, trigger, host_id)
+            if item_id:
+                item_ids.append(item_id)
+                graph_types.append("disk")
             else:
                 error_message = f"No matching disk item found for alarm {alarm_id}"
                 await self.telegram_client.send_message(session, error_message, message_type="ERROR")
 
-        
+        if not item_ids:
+            return
+
+        graph_type = "/".join(graph_types)
+        if self.renderer == "native":
+            response = await self.render_graph_image(session, item_ids, period=self.get_graph_period(trigger), title=trigger['description'])
+        else:
+            response = await self.fetch_graph_image(session, item_ids, period=self.get_graph_period(trigger))
+        if response is None:
+            error_message = f"Failed to retrieve graph image for {graph_type} alarm {alarm_id}"
+            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            return
+
+        # Every chat has its own rate budget, the uploads run concurrently and the file is removed after the last one
+        try:
+            results = await asyncio.gather(*[
+                self.telegram_client.send_graph_image(session, response, reply_to_message_id=reply_id, chat_id=chat_id, delete_file=False)
+                for chat_id, reply_id in targets.items()
+            ])
+        finally:
+            self.telegram_client.delete_image(response)
+        for chat_id, result in zip(targets, results):
+            if result:
+                self.logger.info(f"Sent {graph_type} graph image for alarm {alarm_id} to chat {chat_id}")
+            else:
+                error_message = f"Failed to send graph image for {graph_type} alarm {alarm_id} to chat {chat_id}"
+                await self.telegram_client.send_message(session, error_message, message_type="ERROR")
@@ -0,0 +1,174 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# Numeric value types of item.get, the only ones that can be drawn
+VALUE_TYPE_FLOAT = "0"
+VALUE_TYPE_UNSIGNED = "3"
+
+
+def downsample(clocks, values, time_from, period, width, minimums=None, maximums=None):
+    # One min/avg/max point per pixel column, so the drawing cost only depends on WIDTH.
+    # Trends bring their own hourly min/max, plain history uses the values for all three.
+    import numpy as np
+
+    clocks = np.asarray(clocks, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    minimums = values if minimums is None else np.asarray(minimums, dtype=np.float64)
+    maximums = values if maximums is None else np.asarray(maximums, dtype=np.float64)
+
+    order = np.argsort(clocks, kind="stable")
+    clocks, values, minimums, maximums = clocks[order], values[order], minimums[order], maximums[order]
+
+    columns = np.clip((clocks - time_from) * width // period, 0, width - 1)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    counts = np.diff(np.r_[starts, len(columns)])
+
+    # Middle of each pixel column, in whole seconds
+    times = (time_from + (2 * columns[starts] + 1) * period // (2 * width)).astype("datetime64[s]")
+    return (times,
+            np.minimum.reduceat(minimums, starts),
+            np.add.reduceat(values, starts) / counts,
+            np.maximum.reduceat(maximums, starts))
+
+
+def render_png(series, time_from, time_till, width, height, title):
+    # Runs in a worker process. The object oriented matplotlib API with the Agg canvas
+    # is used, pyplot keeps global state
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+    import numpy as np
+
+    period = max(1, time_till - time_from)
+    figure = Figure(figsize=(width / 100, height / 100), dpi=100)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    for item in series:
+        if not item["clocks"]:
+            continue
+        times, minimums, averages, maximums = downsample(item["clocks"], item["values"], time_from, period, width,
+                                                         item.get("minimums"), item.get("maximums"))
+        label = f"{item['name']} [{item['units']}]" if item["units"] else item["name"]
+        line, = axes.plot(times, averages, linewidth=1, label=label)
+        axes.fill_between(times, minimums, maximums, color=line.get_color(), alpha=0.2, linewidth=0)
+
+    axes.set_xlim(np.datetime64(time_from, "s"), np.datetime64(time_till, "s"))
+    axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(axes.xaxis.get_major_locator()))
+    axes.grid(True, linewidth=0.3)
+    axes.set_title(title, fontsize=9)
+    axes.tick_params(labelsize=7)
+    if axes.lines:
+        axes.legend(fontsize=7, loc="upper left")
+    figure.tight_layout()
+
+    output = io.BytesIO()
+    figure.savefig(output, format="png")
+    return output.getvalue()
+
+
+class NativeGraphRenderer:
+    # Draws graphs from history.get / trend.get data, needs only API access (no frontend,
+    # no browser session). numpy and matplotlib are only imported in the worker processes.
+    # Longer periods use hourly trends, history is usually kept for a few days only
+    TREND_PERIOD = 2 * 86400
+
+    def __init__(self, worker_count=2, logger=None):
+        self.worker_count = worker_count
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            # spawn: forking a process with a running event loop and open sockets is unsafe
+            self.executor = ProcessPoolExecutor(max_workers=self.worker_count, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def api_request(self, session, api_url, token, method, params):
+        headers = {"Content-Type": "application/json-rpc"}
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "auth": token,
+            "id": 1
+        }
+        async with session.post(api_url, headers=headers, json=payload) as response:
+            response_data = await response.json()
+        if "error" in response_data:
+            raise ValueError(f"{method} failed: {response_data['error']}")
+        return response_data.get("result", [])
+
+    async def fetch_series(self, session, api_url, token, item_ids, time_from, time_till):
+        items = await self.api_request(session, api_url, token, "item.get", {
+            "output": ["itemid", "name", "units", "value_type"],
+            "itemids": item_ids
+        })
+        series = {item["itemid"]: {"name": item["name"], "units": item["units"], "value_type": item["value_type"], "clocks": [], "values": []}
+                  for item in items if item["value_type"] in (VALUE_TYPE_FLOAT, VALUE_TYPE_UNSIGNED)}
+        if not series:
+            return []
+
+        if time_till - time_from > self.TREND_PERIOD:
+            for entry in series.values():
+                entry["minimums"] = []
+                entry["maximums"] = []
+            # One request for all items, trends are stored for every numeric type together
+            trends = await self.api_request(session, api_url, token, "trend.get", {
+                "output": ["itemid", "clock", "value_min", "value_avg", "value_max"],
+                "itemids": list(series),
+                "time_from": time_from,
+                "time_till": time_till
+            })
+            for trend in trends:
+                entry = series[trend["itemid"]]
+                entry["clocks"].append(int(trend["clock"]))
+                entry["values"].append(float(trend["value_avg"]))
+                entry["minimums"].append(float(trend["value_min"]))
+                entry["maximums"].append(float(trend["value_max"]))
+        else:
+            # history.get reads one value type per request, the items of each type are fetched together
+            value_types = {entry["value_type"] for entry in series.values()}
+            requests = [self.api_request(session, api_url, token, "history.get", {
+                "output": ["itemid", "clock", "value"],
+                "history": int(value_type),
+                "itemids": [item_id for item_id, entry in series.items() if entry["value_type"] == value_type],
+                "time_from": time_from,
+                "time_till": time_till,
+                "sortfield": "clock",
+                "sortorder": "ASC"
+            }) for value_type in value_types]
+            for history in await asyncio.gather(*requests):
+                for record in history:
+                    entry = series[record["itemid"]]
+                    entry["clocks"].append(int(record["clock"]))
+                    entry["values"].append(float(record["value"]))
+
+        return [series[str(item_id)] for item_id in item_ids if str(item_id) in series]
+
+    async def render(self, session, api_url, token, item_ids, period, width, height, title):
+        # Returns the file name of the PNG, like GraphManager.fetch_graph_image
+        time_till = int(time.time())
+        time_from = time_till - period
+        series = await self.fetch_series(session, api_url, token, item_ids, time_from, time_till)
+        if not any(entry["clocks"] for entry in series):
+            self.logger.error(f"No history data for itemids: {item_ids}")
+            return None
+
+        loop = asyncio.get_running_loop()
+        graph_image = await loop.run_in_executor(self.get_executor(), render_png, series, time_from, time_till, width, height, title)
+
+        file_name = f"item_graph_{'_'.join(str(item_id) for item_id in item_ids)}_{time_till}_{uuid.uuid4().hex[:8]}.png"
+        with open(file_name, "wb") as f:
+            f.write(graph_image)
+        return file_name
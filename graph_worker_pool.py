@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+class GraphWorkerPool:
+    def __init__(self, graph_manager, worker_count=2, queue_size=100, job_deadline=60, logger=None):
+        self.graph_manager = graph_manager
+        self.worker_count = worker_count
+        self.queue_size = queue_size
+        self.job_deadline = job_deadline
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.queue = None
+        self.workers = []
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "dropped": 0,
+            "expired": 0,
+            "timed_out": 0,
+            "failed": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0
+        }
+
+    def start(self, session):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [asyncio.create_task(self.worker(session, index)) for index in range(self.worker_count)]
+        self.logger.info(f"Started {self.worker_count} graph workers with queue size {self.queue_size}.")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, trigger, host_id, alarm_id, targets):
+        # One job per alarm, targets maps every destination chat to the alert to reply to.
+        # Never wait for room in the queue, alerts must not be delayed by graphs
+        job = {
+            "trigger": trigger,
+            "host_id": host_id,
+            "alarm_id": alarm_id,
+            "targets": targets,
+            "queued_at": time.monotonic()
+        }
+        try:
+            self.queue.put_nowait(job)
+            self.stats["submitted"] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            self.logger.warning(f"Graph queue is full, dropped graph for alarm {alarm_id}.")
+            return False
+
+    async def worker(self, session, index):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run_job(session, job)
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, session, job):
+        alarm_id = job["alarm_id"]
+        # The deadline covers the time spent waiting in the queue as well
+        remaining = self.job_deadline - (time.monotonic() - job["queued_at"])
+        if remaining <= 0:
+            self.stats["expired"] += 1
+            self.logger.warning(f"Graph job for alarm {alarm_id} expired in queue, skipping.")
+            return
+
+        try:
+            await asyncio.wait_for(
+                self.graph_manager.process_graphs(session, job["trigger"], job["host_id"], alarm_id, job["targets"]),
+                timeout=remaining
+            )
+            latency = time.monotonic() - job["queued_at"]
+            self.stats["completed"] += 1
+            self.stats["total_latency"] += latency
+            self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            self.logger.warning(f"Graph job for alarm {alarm_id} exceeded its {self.job_deadline} seconds deadline.")
+        except Exception as e:
+            self.stats["failed"] += 1
+            self.logger.error(f"Error in graph job for alarm {alarm_id}: {e}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queued"] = self.queue.qsize() if self.queue else 0
+        stats["average_latency"] = stats["total_latency"] / stats["completed"] if stats["completed"] else 0.0
+        return stats
+
+    def format_stats(self):
+        stats = self.get_stats()
+        return (f"Graph queue: {stats['queued']} queued, {stats['completed']} completed, {stats['dropped']} dropped, "
+                f"{stats['expired'] + stats['timed_out']} past deadline, {stats['failed']} failed, "
+                f"latency avg {stats['average_latency']:.1f}s / max {stats['max_latency']:.1f}s")
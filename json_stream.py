@@ -0,0 +1,112 @@
+import codecs
+import json
+
+class JsonRpcStream:
+    # Incremental parser for JSON-RPC responses: the elements of the "result" array are returned
+    # as soon as they are complete, everything else ("error", "id", ...) ends up in envelope.
+    # Only the current element is buffered, so memory does not grow with the result size.
+    WHITESPACE = " \t\n\r"
+    # Characters that continue a number raw_decode has already accepted
+    NUMBER_CONTINUATION = ".eE+-"
+
+    def __init__(self, array_key="result"):
+        self.array_key = array_key
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.state = "start"
+        self.key = None
+        self.envelope = {}
+        self.element_count = 0
+
+    def skip_whitespace(self, position):
+        while position < len(self.buffer) and self.buffer[position] in self.WHITESPACE:
+            position += 1
+        return position
+
+    def decode_value(self, position, final):
+        # A value is only complete if something follows it, "12" may still become "123"
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, position)
+        except json.JSONDecodeError:
+            return None, None
+        if end >= len(self.buffer) and not final:
+            return None, None
+        if not final and isinstance(value, (int, float)) and not isinstance(value, bool) and self.buffer[end] in self.NUMBER_CONTINUATION:
+            # "1." or "1e" split by a chunk boundary, the rest of the number is still to come
+            return None, None
+        return value, end
+
+    def feed(self, chunk, final=False):
+        self.buffer += self.text_decoder.decode(chunk, final)
+        elements = []
+        position = 0
+
+        while True:
+            position = self.skip_whitespace(position)
+            if position >= len(self.buffer):
+                break
+            char = self.buffer[position]
+
+            if self.state == "start":
+                if char != "{":
+                    raise ValueError(f"Expected a JSON-RPC object, got '{char}'")
+                position += 1
+                self.state = "key"
+            elif self.state == "key":
+                if char == "}":
+                    position += 1
+                    self.state = "done"
+                    continue
+                if char == ",":
+                    position += 1
+                    continue
+                key, end = self.decode_value(position, final)
+                if end is None:
+                    break
+                self.key = key
+                position = end
+                self.state = "colon"
+            elif self.state == "colon":
+                if char != ":":
+                    raise ValueError(f"Expected ':' after key '{self.key}', got '{char}'")
+                position += 1
+                self.state = "value"
+            elif self.state == "value":
+                if self.key == self.array_key and char == "[":
+                    position += 1
+                    self.state = "array"
+                    continue
+                value, end = self.decode_value(position, final)
+                if end is None:
+                    break
+                self.envelope[self.key] = value
+                position = end
+                self.state = "key"
+            elif self.state == "array":
+                if char == "]":
+                    position += 1
+                    self.state = "key"
+                    continue
+                if char == ",":
+                    position += 1
+                    continue
+                element, end = self.decode_value(position, final)
+                if end is None:
+                    break
+                elements.append(element)
+                position = end
+            else:
+                raise ValueError(f"Unexpected data after the end of the JSON-RPC response: '{char}'")
+
+        # Keep only the unparsed rest, the start of an incomplete element
+        self.buffer = self.buffer[position:]
+        self.element_count += len(elements)
+        return elements
+
+    def close(self):
+        # Raises ValueError if the response ended before it was complete
+        elements = self.feed(b"", final=True)
+        if self.state != "done":
+            raise ValueError(f"Truncated JSON-RPC response after {self.element_count} elements")
+        return elements
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+class LeaderLease:
+    # Active/standby election between instances on one host through a lease row in a shared
+    # SQLite file. The leader renews the lease with a heartbeat; when it stops renewing, a
+    # standby takes over once the lease has expired. The leader also stores its alarm state
+    # here, so the new leader knows which problems were already alerted.
+    LEASE_NAME = "tz-manager"
+
+    def __init__(self, database_file, ttl=10, instance_id=None, logger=None):
+        self.database_file = database_file
+        self.ttl = ttl
+        self.heartbeat_interval = max(1.0, ttl / 3)
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.is_leader = False
+        self.became_leader = asyncio.Event()
+        # Called with the new leadership state whenever it changes. It runs in its own task,
+        # a slow callback (Telegram rate limits) must not delay the heartbeat past the TTL
+        self.on_change = None
+        self.change_task = None
+        self.task = None
+
+        # Short busy timeout, a heartbeat must never stall the event loop for long
+        self.connection = sqlite3.connect(database_file, timeout=1)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def try_acquire(self):
+        # Takes or renews the lease if it is free, expired or already ours; wall clock time
+        # because the expiry is compared between processes
+        now = time.time()
+        try:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute("SELECT holder, expires FROM lease WHERE name = ?", (self.LEASE_NAME,)).fetchone()
+                if row is not None and row[0] != self.instance_id and row[1] > now:
+                    return False
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO lease (name, holder, expires) VALUES (?, ?, ?)",
+                    (self.LEASE_NAME, self.instance_id, now + self.ttl)
+                )
+                return True
+        except sqlite3.OperationalError as e:
+            # Locked by another instance: keep the current role, the next heartbeat retries.
+            # A leader that cannot renew before the lease expires steps down below.
+            self.logger.warning(f"Lease heartbeat failed: {e}")
+            return None
+
+    def get_holder(self):
+        row = self.connection.execute("SELECT holder, expires FROM lease WHERE name = ?", (self.LEASE_NAME,)).fetchone()
+        return row[0] if row and row[1] > time.time() else None
+
+    def set_leader(self, is_leader):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        if is_leader:
+            self.became_leader.set()
+            self.logger.info(f"Instance {self.instance_id} is now the active instance.")
+        else:
+            self.became_leader.clear()
+            self.logger.warning(f"Instance {self.instance_id} lost the lease and is standby now.")
+        if self.on_change:
+            self.change_task = asyncio.create_task(self.notify_change(self.change_task, is_leader))
+
+    async def notify_change(self, previous_task, is_leader):
+        # Changes are handled in order, a takeover never overtakes the step down before it
+        if previous_task is not None:
+            await asyncio.gather(previous_task, return_exceptions=True)
+        try:
+            await self.on_change(is_leader)
+        except Exception as e:
+            self.logger.error(f"Error handling the leadership change: {e}")
+
+    async def run(self):
+        last_renewed = 0.0
+        while True:
+            acquired = self.try_acquire()
+            if acquired:
+                last_renewed = time.monotonic()
+                self.set_leader(True)
+            elif acquired is False:
+                self.set_leader(False)
+            elif self.is_leader and time.monotonic() - last_renewed > self.ttl:
+                # Could not renew in time, another instance may already have taken over
+                self.set_leader(False)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def start(self):
+        holder = self.get_holder()
+        if holder and holder != self.instance_id:
+            self.logger.info(f"Instance {self.instance_id} starting as standby, {holder} is active.")
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.change_task is not None:
+            self.change_task.cancel()
+            await asyncio.gather(self.change_task, return_exceptions=True)
+            self.change_task = None
+        if self.is_leader:
+            # Release right away, the standby does not have to wait for the lease to expire
+            with self.connection:
+                self.connection.execute("UPDATE lease SET expires = 0 WHERE name = ? AND holder = ?", (self.LEASE_NAME, self.instance_id))
+            self.is_leader = False
+
+    async def wait_for_leadership(self, timeout):
+        try:
+            await asyncio.wait_for(self.became_leader.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.is_leader
+
+    def save_state(self, name, value):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO state (name, value, updated) VALUES (?, ?, ?)",
+                (name, json.dumps(value, separators=(",", ":")), time.time())
+            )
+
+    def load_state(self, name, default=None):
+        row = self.connection.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def close(self):
+        self.connection.close()
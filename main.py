@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
-import asyncio
 import time
+# Taken before the other imports so the startup time covers them as well
+PROCESS_START_TIME = time.time()
+import asyncio
+import configparser
+import os
+import signal
 from aiohttp import ClientSession
 from config_manager import ConfigManager
 from graph_manager import GraphManager
@@ -8,54 +13,46 @@ from logger_manager import LoggerManager
 from telegram_client import TelegramClient
 from zabbix_client import ZabbixClient
 from alarm_manager import AlarmManager
-from selenium import webdriver
+from graph_worker_pool import GraphWorkerPool
+from flap_detector import FlapDetector
+from diagnostics import Diagnostics
+from outbox import Outbox
+from alarm_router import AlarmRouter
+from leader_lease import LeaderLease
+from traffic_trace import TraceRecorder, RecordingSession, ReplaySession
 
 class MonitoringApplication:
+    # ZabbixClient settings that invalidate the current API token / web session when changed
+    RELOGIN_OPTIONS = ['api_url', 'user', 'password', 'login_url', 'executable_path', 'binary_location']
+
     def __init__(self):
         self.config_manager = ConfigManager('config.ini')
         self.logger_manager = LoggerManager('logs.log')
-        settings = self.config_manager.get_settings()
-        trigger_filters = self.config_manager.get_trigger_filters()
+        self.reload_requested = False
+        self.trace_recorder = None
+        self.session = None
 
         self.logger = self.logger_manager.logger
-        self.telegram_client = TelegramClient(settings['BOT_TOKEN'], settings['CHAT_ID'], logger=self.logger)
+        self.telegram_options = self.build_telegram_options()
+        self.telegram_client = TelegramClient(logger=self.logger, **self.telegram_options)
 
         # Initialize GraphManager without zabbix_client
-        graph_settings = self.config_manager.get_graph_settings()
+        self.graph_options = self.build_graph_options()
         self.graph_manager = GraphManager(
-            api_url=settings['API_URL'],
-            base_url=graph_settings['BASE_URL'], 
             telegram_client=self.telegram_client,
-            width=int(graph_settings['WIDTH']),
-            height=int(graph_settings['HEIGTH']), 
             zabbix_client=None,  # Initially set to None
-            logger=self.logger
+            logger=self.logger,
+            **self.graph_options
         )
 
         # Initialize ZabbixClient with the partially initialized GraphManager
+        self.zabbix_options = self.build_zabbix_options()
         self.zabbix_client = ZabbixClient(
-            api_url=settings['API_URL'],
-            user=settings['API_USER'],
-            password=settings['API_PASSWORD'],
             telegram_client=self.telegram_client,
-            max_login_retries=int(settings['MAX_LOGIN_RETRIES']),
-            login_retry_delay=int(settings['LOGIN_RETRY_DELAY']),
-            cleanup_interval=int(settings['CLEANUP_INTERVAL']),
-            use_trigger_filters=settings.get('USE_TRIGGER_FILTERS', 'True').lower() == 'true',
-            main_loop_sleep_duration=int(settings['MAIN_LOOP_SLEEP_DURATION']),
-            trigger_filters=trigger_filters,
             script_start_time=time.time(),
-            retention_period=int(settings['RETENTION_PERIOD']),
-            min_severity=int(settings['MIN_SEVERITY']),
-            login_retry_interval=int(settings['LOGIN_RETRY_INTERVAL']),
-            login_url=graph_settings['LOGIN_URL'],
             graph_manager=self.graph_manager,
-            send_graphs=graph_settings.get('SEND_GRAPHS', 'True').lower() == 'true',
-            executable_path=graph_settings['EXECUTABLE_PATH'],
-            binary_location=graph_settings['BINARY_LOCATION'],
-            use_duration_threshold=settings.get('USE_DURATION_THRESHOLD', 'True').lower() == 'true',
-            duration_threshold=int(settings['DURATION_THRESHOLD']),
-            logger=self.logger
+            logger=self.logger,
+            **self.zabbix_options
         )
 
         # Now, update the GraphManager with the fully initialized ZabbixClient
@@ -63,27 +60,321 @@ class MonitoringApplication:
         self.graph_manager.session_cookie = self.zabbix_client
 
         # Initialize AlarmManager
+        self.alarm_options = self.build_alarm_options()
+        self.flap_options = self.build_flap_options()
         self.alarm_manager = AlarmManager(
-            send_resolved_restarts=settings.get('SEND_RESOLVED_RESTARTS', 'True').lower() == 'true', 
-            send_reminder=settings.get('SEND_REMINDER', 'True').lower() == 'true',
-            telegram_client=self.telegram_client, 
-            reminder_threshold=int(settings['REMINDER_THRESHOLD']), 
+            telegram_client=self.telegram_client,
+            graph_manager=self.graph_manager,
+            flap_detector=FlapDetector(**self.flap_options) if self.flap_detection_enabled() else None,
+            logger=self.logger,
+            **self.alarm_options
+        )
+
+        # Graphs are attached by a background worker pool
+        self.graph_worker_options = self.build_graph_worker_options()
+        self.graph_worker_pool = GraphWorkerPool(
             graph_manager=self.graph_manager,
-            send_old_resolved = settings.get('SEND_OLD_RESOLVED', 'True').lower() == 'true',
-            send_graphs=graph_settings.get('SEND_GRAPHS', 'True').lower() == 'true',
-            logger=self.logger
+            logger=self.logger,
+            **self.graph_worker_options
         )
+        # At most one graph per worker is rendered at a time
+        self.graph_manager.native_renderer.worker_count = self.graph_worker_options["worker_count"]
+
+        # Durable outbox, AlarmManager messages are queued and delivered in the background
+        self.outbox = None
+        settings = self.config_manager.get_settings()
+        if settings.get('USE_OUTBOX', 'False').lower() == 'true':
+            self.outbox = Outbox(
+                database_file=settings.get('OUTBOX_FILE', 'outbox.db'),
+                telegram_client=self.telegram_client,
+                max_attempts=int(settings.get('OUTBOX_MAX_ATTEMPTS', '20')),
+                logger=self.logger
+            )
+            self.outbox.reply_resolver = self.alarm_manager.resolve_reply_to
+            self.outbox.delivery_callback = self.alarm_manager.on_message_delivered
+            self.outbox.drop_callback = self.alarm_manager.on_message_dropped
+
+        # Routing rules send alarms to one or more chats, the trigger fields they need are requested from Zabbix
+        self.set_router(self.config_manager.get_routing_rules())
 
         # Pass dependencies to AlarmManager and ZabbixClient
+        self.alarm_manager.graph_worker_pool = self.graph_worker_pool
+        self.alarm_manager.outbox = self.outbox
         self.alarm_manager.zabbix_client = self.zabbix_client
         self.zabbix_client.alarm_manager = self.alarm_manager
-        
+        self.zabbix_client.config_reloader = self.reload_config_if_requested
+        self.zabbix_client.startup_started_at = PROCESS_START_TIME
+
+        # Active/standby mode, instances sharing HA_LEASE_FILE elect one active instance
+        self.leader_lease = None
+        if settings.get('HA_MODE', 'False').lower() == 'true':
+            self.leader_lease = LeaderLease(
+                database_file=settings.get('HA_LEASE_FILE', 'ha.db'),
+                ttl=int(settings.get('HA_LEASE_TTL', '10')),
+                instance_id=settings.get('HA_INSTANCE_ID', '').strip() or None,
+                logger=self.logger
+            )
+            self.leader_lease.on_change = self.leadership_changed
+            self.zabbix_client.leader_lease = self.leader_lease
+
+        # Runtime diagnostics, switched on and off with SIGUSR1 / SIGUSR2
+        self.diagnostics = Diagnostics(output_directory=os.getcwd(), logger=self.logger, **self.build_diagnostics_options())
+        self.zabbix_client.diagnostics = self.diagnostics
+
+    def build_telegram_options(self):
+        settings = self.config_manager.get_settings()
+        return {
+            "bot_token": settings['BOT_TOKEN'],
+            "chat_id": settings['CHAT_ID'],
+            "message_interval": int(settings.get('CHAT_MESSAGE_INTERVAL', '0')) / 1000
+        }
+
+    def build_graph_options(self):
+        settings = self.config_manager.get_settings()
+        graph_settings = self.config_manager.get_graph_settings()
+        return {
+            "api_url": settings['API_URL'],
+            "base_url": graph_settings['BASE_URL'],
+            "width": int(graph_settings['WIDTH']),
+            "height": int(graph_settings['HEIGTH']),
+            "min_period": int(graph_settings.get('MIN_PERIOD', '3600')),
+            "max_period": int(graph_settings.get('MAX_PERIOD', '604800')),
+            "renderer": graph_settings.get('GRAPH_RENDERER', 'frontend').strip().lower()
+        }
+
+    def build_zabbix_options(self):
+        settings = self.config_manager.get_settings()
+        graph_settings = self.config_manager.get_graph_settings()
+        return {
+            "api_url": settings['API_URL'],
+            "user": settings['API_USER'],
+            "password": settings['API_PASSWORD'],
+            "max_login_retries": int(settings['MAX_LOGIN_RETRIES']),
+            "login_retry_delay": int(settings['LOGIN_RETRY_DELAY']),
+            "cleanup_interval": int(settings['CLEANUP_INTERVAL']),
+            "use_trigger_filters": settings.get('USE_TRIGGER_FILTERS', 'True').lower() == 'true',
+            "main_loop_sleep_duration": int(settings['MAIN_LOOP_SLEEP_DURATION']),
+            "trigger_filters": self.config_manager.get_trigger_filters(),
+            "retention_period": int(settings['RETENTION_PERIOD']),
+            "min_severity": int(settings['MIN_SEVERITY']),
+            "login_retry_interval": int(settings['LOGIN_RETRY_INTERVAL']),
+            "login_url": graph_settings['LOGIN_URL'],
+            "send_graphs": graph_settings.get('SEND_GRAPHS', 'True').lower() == 'true',
+            "executable_path": graph_settings['EXECUTABLE_PATH'],
+            "binary_location": graph_settings['BINARY_LOCATION'],
+            "use_duration_threshold": settings.get('USE_DURATION_THRESHOLD', 'True').lower() == 'true',
+            "duration_threshold": int(settings['DURATION_THRESHOLD']),
+            "single_query_filters": settings.get('SINGLE_QUERY_FILTERS', 'False').lower() == 'true',
+            "startup_time_target": int(settings.get('STARTUP_TIME_TARGET', '60')),
+            "trigger_page_size": int(settings.get('TRIGGER_PAGE_SIZE', '1000'))
+        }
+
+    def build_alarm_options(self):
+        settings = self.config_manager.get_settings()
+        graph_settings = self.config_manager.get_graph_settings()
+        return {
+            "send_resolved_restarts": settings.get('SEND_RESOLVED_RESTARTS', 'True').lower() == 'true',
+            "send_reminder": settings.get('SEND_REMINDER', 'True').lower() == 'true',
+            "reminder_threshold": int(settings['REMINDER_THRESHOLD']),
+            "send_old_resolved": settings.get('SEND_OLD_RESOLVED', 'True').lower() == 'true',
+            "send_graphs": graph_settings.get('SEND_GRAPHS', 'True').lower() == 'true',
+            "edit_in_place": settings.get('EDIT_IN_PLACE', 'False').lower() == 'true',
+            "edit_interval": int(settings.get('EDIT_INTERVAL', '60'))
+        }
+
+    def flap_detection_enabled(self):
+        return self.config_manager.get_settings().get('FLAP_DETECTION', 'False').lower() == 'true'
+
+    def build_flap_options(self):
+        settings = self.config_manager.get_settings()
+        return {
+            "window": int(settings.get('FLAP_WINDOW', '900')),
+            "start_threshold": int(settings.get('FLAP_START_THRESHOLD', '5')),
+            "stop_threshold": int(settings.get('FLAP_STOP_THRESHOLD', '2'))
+        }
+
+    def build_graph_worker_options(self):
+        graph_settings = self.config_manager.get_graph_settings()
+        return {
+            "worker_count": int(graph_settings.get('GRAPH_WORKERS', '2')),
+            "queue_size": int(graph_settings.get('GRAPH_QUEUE_SIZE', '100')),
+            "job_deadline": int(graph_settings.get('GRAPH_JOB_DEADLINE', '60'))
+        }
+
+    def build_diagnostics_options(self):
+        settings = self.config_manager.get_settings()
+        return {
+            "lag_threshold": int(settings.get('LOOP_LAG_THRESHOLD', '250')) / 1000,
+            "slow_callback_duration": int(settings.get('SLOW_CALLBACK_THRESHOLD', '100')) / 1000,
+            "profile_cycles": int(settings.get('PROFILE_CYCLES', '3'))
+        }
+
+    def set_router(self, routing_rules):
+        self.routing_rules = routing_rules
+        router = AlarmRouter(routing_rules, self.telegram_client.chat_id, logger=self.logger) if routing_rules else None
+        self.alarm_manager.router = router
+        self.zabbix_client.trigger_selects = router.get_trigger_selects() if router else {}
+
+    def wrap_session(self, session):
+        # TRACE_MODE = record writes the Zabbix traffic to TRACE_FILE, replay serves it back
+        settings = self.config_manager.get_settings()
+        trace_mode = settings.get('TRACE_MODE', 'off').lower()
+        trace_file = settings.get('TRACE_FILE', 'zabbix_trace.jsonl.gz')
+        if trace_mode == 'record':
+            self.trace_recorder = TraceRecorder(trace_file, logger=self.logger)
+            return RecordingSession(session, self.trace_recorder, settings['API_URL'])
+        if trace_mode == 'replay':
+            return ReplaySession(trace_file, settings['API_URL'], speed=float(settings.get('REPLAY_SPEED', '1.0')), logger=self.logger)
+        return session
+
+    async def leadership_changed(self, is_leader):
+        if is_leader:
+            # Continue from the alarm state of the previous active instance
+            self.alarm_manager.restore_state(self.leader_lease.load_state("sent_alarms", {}))
+            if self.outbox:
+                # Messages the previous active instance left in a shared outbox are delivered as well
+                self.outbox.start(self.session)
+            info_message = f"TZ-MANAGER instance {self.leader_lease.instance_id} is active with {len(self.alarm_manager.sent_alarms)} known alarms."
+            await self.telegram_client.send_message(self.session, info_message, message_type="INFO")
+        elif self.outbox:
+            await self.outbox.stop()
+
+    def request_config_reload(self):
+        self.logger.info("SIGHUP received, configuration will be reloaded before the next cycle.")
+        self.reload_requested = True
+
+    def apply_options(self, component, old_options, new_options):
+        # Only touch the attributes whose values actually changed, sessions and state are kept
+        changed = [name for name, value in new_options.items() if old_options.get(name) != value]
+        for name in changed:
+            setattr(component, name, new_options[name])
+        return changed
+
+    async def reload_config_if_requested(self, session):
+        watch_config = self.config_manager.get_settings().get('WATCH_CONFIG', 'False').lower() == 'true'
+        if not self.reload_requested and not (watch_config and self.config_manager.has_changed_on_disk()):
+            return
+        self.reload_requested = False
+
+        try:
+            self.config_manager.reload()
+            telegram_options = self.build_telegram_options()
+            graph_options = self.build_graph_options()
+            zabbix_options = self.build_zabbix_options()
+            alarm_options = self.build_alarm_options()
+            graph_worker_options = self.build_graph_worker_options()
+            flap_options = self.build_flap_options()
+            diagnostics_options = self.build_diagnostics_options()
+            routing_rules = self.config_manager.get_routing_rules()
+        except (ValueError, KeyError, configparser.Error) as e:
+            self.config_manager.rollback()
+            error_message = f"Configuration reload failed, keeping previous settings: {e}"
+            self.logger.error(error_message)
+            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+            return
+
+        changes = {
+            "TelegramClient": self.apply_options(self.telegram_client, self.telegram_options, telegram_options),
+            "GraphManager": self.apply_options(self.graph_manager, self.graph_options, graph_options),
+            "ZabbixClient": self.apply_options(self.zabbix_client, self.zabbix_options, zabbix_options),
+            "AlarmManager": self.apply_options(self.alarm_manager, self.alarm_options, alarm_options),
+            "GraphWorkerPool": self.apply_options(self.graph_worker_pool, self.graph_worker_options, graph_worker_options)
+        }
+
+        # Diagnostics have no state worth keeping apart from a running profile, apply directly
+        for name, value in diagnostics_options.items():
+            setattr(self.diagnostics, name, value)
+
+        if not self.flap_detection_enabled():
+            if self.alarm_manager.flap_detector is not None:
+                self.alarm_manager.flap_detector = None
+                changes["AlarmManager"].append("flap_detector")
+        elif self.alarm_manager.flap_detector is None:
+            self.alarm_manager.flap_detector = FlapDetector(**flap_options)
+            changes["AlarmManager"].append("flap_detector")
+        else:
+            # Existing transition history is kept, only the thresholds change
+            changes["FlapDetector"] = self.apply_options(self.alarm_manager.flap_detector, self.flap_options, flap_options)
+
+        if "worker_count" in changes["GraphWorkerPool"] or "queue_size" in changes["GraphWorkerPool"]:
+            # Queued graph jobs are dropped, alerts themselves are not affected
+            await self.graph_worker_pool.stop()
+            self.graph_worker_pool.start(session)
+        if "worker_count" in changes["GraphWorkerPool"] or "renderer" in changes["GraphManager"]:
+            # The render processes are recreated with the new size on the next native graph
+            self.graph_manager.native_renderer.worker_count = graph_worker_options["worker_count"]
+            self.graph_manager.native_renderer.shutdown()
+
+        if routing_rules != self.routing_rules or "chat_id" in changes["TelegramClient"]:
+            # Alarms already sent keep their chats, new alarms are routed with the new rules
+            self.set_router(routing_rules)
+            changes["AlarmManager"].append("routing")
+
+        if "trigger_filters" in changes["ZabbixClient"]:
+            # Recompile the matcher so the new filters are used from the next cycle on
+            self.zabbix_client.set_trigger_filters(zabbix_options["trigger_filters"])
+
+        relogin = any(name in self.RELOGIN_OPTIONS for name in changes["ZabbixClient"])
+        if "send_graphs" in changes["ZabbixClient"] and zabbix_options["send_graphs"]:
+            # Graphs were switched on, a web session cookie is needed
+            relogin = True
+        if "renderer" in changes["GraphManager"] and zabbix_options["send_graphs"] and self.graph_manager.needs_web_session():
+            # Back to chart.php, which needs the browser session
+            relogin = True
+        if relogin:
+            self.zabbix_client.token = None
+
+        self.telegram_options = telegram_options
+        self.graph_options = graph_options
+        self.zabbix_options = zabbix_options
+        self.alarm_options = alarm_options
+        self.graph_worker_options = graph_worker_options
+        self.flap_options = flap_options
+
+        changed_components = [f"{name} ({', '.join(changed)})" for name, changed in changes.items() if changed]
+        if changed_components:
+            info_message = f"Configuration reloaded, updated: {'; '.join(changed_components)}"
+            if relogin:
+                info_message += ". Logging in again with the new credentials."
+        else:
+            info_message = "Configuration reloaded, no settings changed."
+        self.logger.info(info_message)
+        if not self.zabbix_client.is_standby():
+            await self.telegram_client.send_message(session, info_message, message_type="INFO")
 
     async def run(self):
+        if hasattr(signal, 'SIGHUP'):
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGHUP, self.request_config_reload)
+            loop.add_signal_handler(signal.SIGUSR1, self.diagnostics.request_profile)
+            loop.add_signal_handler(signal.SIGUSR2, self.diagnostics.toggle_monitoring)
+
         try:
-            async with ClientSession() as session:
-                await self.telegram_client.send_message(session, "TZ-MANAGER started.", message_type="INFO")
-                await self.zabbix_client.fetch_and_distribute_triggers(session)
+            async with ClientSession() as client_session:
+                session = self.wrap_session(client_session)
+                self.session = session
+                self.graph_worker_pool.start(session)
+                if self.leader_lease:
+                    # The outbox is started once this instance holds the lease, which also
+                    # reports the start; a standby stays silent
+                    self.leader_lease.start()
+                else:
+                    if self.outbox:
+                        self.outbox.start(session)
+                    await self.telegram_client.send_message(session, "TZ-MANAGER started.", message_type="INFO")
+                try:
+                    await self.zabbix_client.fetch_and_distribute_triggers(session)
+                finally:
+                    if self.leader_lease:
+                        await self.leader_lease.stop()
+                        self.leader_lease.close()
+                    await self.graph_worker_pool.stop()
+                    self.graph_manager.native_renderer.shutdown()
+                    if self.outbox:
+                        await self.outbox.stop()
+                        self.outbox.close()
+                    if self.trace_recorder:
+                        self.trace_recorder.close()
 
         except Exception as e:
             error_message = f"Unexpected error occurred: {str(e)}"
@@ -94,4 +385,4 @@ class MonitoringApplication:
 
 if __name__ == "__main__":
     app = MonitoringApplication()
-    asyncio.run(app.run())
\ No newline at end of file
+    asyncio.run(app.run())
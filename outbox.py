@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+class Outbox:
+    def __init__(self, database_file, telegram_client, max_attempts=20, retry_delay=5, max_retry_delay=300, delivery_timeout=30, logger=None):
+        self.database_file = database_file
+        self.telegram_client = telegram_client
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.delivery_timeout = delivery_timeout
+        self.logger = logger if logger else logging.getLogger(__name__)
+        # Set by AlarmManager: message IDs of alarms are only known once the alert is delivered
+        self.reply_resolver = None
+        self.delivery_callback = None
+        self.drop_callback = None
+        self.session = None
+        self.started = False
+        # One delivery lane per destination chat, a slow or rate limited chat does not hold back the others
+        self.lanes = {}
+
+        # WAL keeps enqueueing cheap and safe while the delivery loop reads
+        self.connection = sqlite3.connect(database_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alarm_id TEXT,
+                chat_id TEXT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(outbox)")]
+        if "chat_id" not in columns:
+            # Outboxes written before routing existed were all for the default chat
+            self.connection.execute("ALTER TABLE outbox ADD COLUMN chat_id TEXT")
+        self.connection.commit()
+
+        pending_count = self.connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        if pending_count:
+            self.logger.info(f"Outbox has {pending_count} undelivered messages from a previous run.")
+
+    def enqueue(self, alarm_id, kind, message, message_type, chat_id=None, reply_to_message_id=None, reply_to_alarm=False, edit_message_id=None, graph_job=None,
+                alert_key=None):
+        payload = {
+            "message": message,
+            "message_type": message_type,
+            "reply_to_message_id": reply_to_message_id,
+            "reply_to_alarm": reply_to_alarm,
+            "edit_message_id": edit_message_id,
+            "graph_job": graph_job,
+            # Which alert of the alarm the message belongs to, handed back in the callbacks
+            "alert_key": alert_key
+        }
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO outbox (alarm_id, chat_id, kind, payload, next_attempt, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (alarm_id, chat_id, kind, json.dumps(payload), now, now)
+            )
+        if self.started:
+            self.wake_lane(chat_id)
+
+    def pending_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def wake_lane(self, chat_id):
+        if chat_id not in self.lanes:
+            wakeup = asyncio.Event()
+            self.lanes[chat_id] = (wakeup, asyncio.create_task(self.run(chat_id, wakeup)))
+        self.lanes[chat_id][0].set()
+
+    def start(self, session):
+        self.session = session
+        self.started = True
+        # Lanes for messages left over from a previous run
+        for (chat_id,) in self.connection.execute("SELECT DISTINCT chat_id FROM outbox").fetchall():
+            self.wake_lane(chat_id)
+
+    async def stop(self):
+        tasks = [task for _, task in self.lanes.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.lanes = {}
+        self.started = False
+
+    async def run(self, chat_id, wakeup):
+        while True:
+            # Cleared before delivering so messages enqueued meanwhile trigger another pass
+            wakeup.clear()
+            try:
+                next_attempt = await self.deliver_pending(self.session, chat_id)
+            except Exception as e:
+                self.logger.error(f"Error delivering outbox messages to chat {chat_id}: {e}")
+                next_attempt = time.time() + self.retry_delay
+
+            timeout = max(0.0, next_attempt - time.time()) if next_attempt else None
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def deliver_pending(self, session, chat_id):
+        # Delivers due messages in order and returns when the next retry is due (None if empty).
+        # A message waiting for a retry holds back later messages of the same alarm, so a
+        # resolution can never overtake its alert
+        rows = self.connection.execute(
+            "SELECT id, alarm_id, kind, payload, attempts, next_attempt FROM outbox WHERE chat_id IS ? ORDER BY id", (chat_id,)
+        ).fetchall()
+        blocked_alarms = set()
+        next_attempt = None
+
+        for row_id, alarm_id, kind, payload, attempts, row_next_attempt in rows:
+            if alarm_id is not None and alarm_id in blocked_alarms:
+                continue
+            if row_next_attempt > time.time():
+                if alarm_id is not None:
+                    blocked_alarms.add(alarm_id)
+                next_attempt = row_next_attempt if next_attempt is None else min(next_attempt, row_next_attempt)
+                continue
+
+            payload = json.loads(payload)
+            payload["chat_id"] = chat_id
+            message_id = await self.deliver(session, alarm_id, kind, payload)
+            if message_id:
+                with self.connection:
+                    self.connection.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                if self.delivery_callback:
+                    self.delivery_callback(alarm_id, kind, message_id, payload)
+                continue
+
+            attempts += 1
+            if self.max_attempts and attempts >= self.max_attempts:
+                self.logger.error(f"Dropping outbox {kind} message for alarm {alarm_id} to chat {chat_id} after {attempts} failed attempts: {payload['message']}")
+                with self.connection:
+                    self.connection.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                if self.drop_callback:
+                    self.drop_callback(alarm_id, kind, payload)
+                continue
+
+            # Exponential backoff per message
+            retry_at = time.time() + min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1))
+            with self.connection:
+                self.connection.execute("UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?", (attempts, retry_at, row_id))
+            self.logger.warning(f"Outbox delivery of {kind} message for alarm {alarm_id} to chat {chat_id} failed (attempt {attempts}), retrying in {retry_at - time.time():.0f} seconds.")
+            if alarm_id is not None:
+                blocked_alarms.add(alarm_id)
+            next_attempt = retry_at if next_attempt is None else min(next_attempt, retry_at)
+
+        return next_attempt
+
+    async def deliver(self, session, alarm_id, kind, payload):
+        chat_id = payload["chat_id"]
+        reply_to_message_id = payload["reply_to_message_id"]
+        if reply_to_message_id is None and payload["reply_to_alarm"] and self.reply_resolver:
+            reply_to_message_id = self.reply_resolver(alarm_id, chat_id, payload.get("alert_key"))
+
+        try:
+            if payload["edit_message_id"] is not None:
+                edited = await asyncio.wait_for(
+                    self.telegram_client.edit_message(session, payload["edit_message_id"], payload["message"], message_type=payload["message_type"], chat_id=chat_id),
+                    timeout=self.delivery_timeout
+                )
+                return payload["edit_message_id"] if edited else None
+
+            message_sent = await asyncio.wait_for(
+                self.telegram_client.send_message(session, payload["message"], message_type=payload["message_type"], reply_to_message_id=reply_to_message_id, chat_id=chat_id),
+                timeout=self.delivery_timeout
+            )
+        except asyncio.TimeoutError:
+            self.logger.error(f"Outbox delivery of {kind} message for alarm {alarm_id} timed out after {self.delivery_timeout} seconds.")
+            return None
+        return message_sent.get("message_id") if message_sent else None
+
+    def close(self):
+        self.connection.close()
@@ -1,38 +1,63 @@
 import asyncio
 import os
+import time
 import urllib.parse
 import logging
 import aiohttp
-from selenium import webdriver
 
 class TelegramClient:
-    def __init__(self, bot_token, chat_id, logger=None):
+    def __init__(self, bot_token, chat_id, message_interval=0.0, logger=None):
         self.bot_token = bot_token
+        # Default chat, used for errors, info messages and alarms that no routing rule matches
         self.chat_id = chat_id
+        self.message_interval = message_interval
         self.logger = logger if logger else logging.getLogger(__name__)
         self.image_directory = os.getcwd()
+        # Telegram rate limits per chat, every chat gets its own budget so chats never wait for each other
+        self.chat_locks = {}
+        self.next_send_time = {}
 
-    async def send_message(self, session, message, message_type="ALERT", reply_to_message_id=None):
-        try:
-            # Prefix the message based on its type
-            if message_type == "ERROR":
-                message = f"🚨 Error: {message}"
-            elif message_type == "INFO":
-                message = f"ℹ️ Info: {message}"
-            elif message_type == "ALERT":
-                message = f"⚠️ {message}"
-            elif message_type == "RESOLVED":
-                message = f"✅ {message}"
-            elif message_type == "REMINDER":  # New message type
-                message = f"⏰ Reminder: {message}"
+    async def wait_for_rate_budget(self, chat_id):
+        lock = self.chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            delay = self.next_send_time.get(chat_id, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_send_time[chat_id] = time.monotonic() + self.message_interval
+
+    def rate_limited(self, chat_id, retry_after):
+        # Only this chat is held back until Telegram accepts messages again
+        self.next_send_time[chat_id] = max(self.next_send_time.get(chat_id, 0), time.monotonic() + retry_after)
+
+    def format_message(self, message, message_type):
+        # Prefix the message based on its type
+        if message_type == "ERROR":
+            message = f"🚨 Error: {message}"
+        elif message_type == "INFO":
+            message = f"ℹ️ Info: {message}"
+        elif message_type == "ALERT":
+            message = f"⚠️ {message}"
+        elif message_type == "RESOLVED":
+            message = f"✅ {message}"
+        elif message_type == "REMINDER":  # New message type
+            message = f"⏰ Reminder: {message}"
+        elif message_type == "FLAPPING":
+            message = f"🔁 Flapping: {message}"
 
-            # Format the message as HTML
-            html_message = message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        # Format the message as HTML
+        return message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    async def send_message(self, session, message, message_type="ALERT", reply_to_message_id=None, chat_id=None):
+        chat_id = chat_id or self.chat_id
+        html_message = message
+        try:
+            await self.wait_for_rate_budget(chat_id)
+            html_message = self.format_message(message, message_type)
             
             # URL encode the HTML message
             encoded_message = urllib.parse.quote(html_message)
             
-            send_text = f'https://api.telegram.org/bot{self.bot_token}/sendMessage?chat_id={self.chat_id}&parse_mode=HTML&text={encoded_message}'
+            send_text = f'https://api.telegram.org/bot{self.bot_token}/sendMessage?chat_id={chat_id}&parse_mode=HTML&text={encoded_message}'
             
             if reply_to_message_id:
                 send_text += f'&reply_to_message_id={reply_to_message_id}'
@@ -44,34 +69,70 @@ class TelegramClient:
                     return response_data.get("result")
                 elif response_data.get("error_code") == 429:
                     retry_after = response_data.get("parameters", {}).get("retry_after", 60)
-                    self.logger.info(f"Rate limit hit, retrying after {retry_after} seconds")
-                    await asyncio.sleep(retry_after)  # Wait before retrying
-                    return await self.send_message(session, message, message_type, reply_to_message_id)  # Recursively retry sending the message
+                    self.logger.info(f"Rate limit hit for chat {chat_id}, retrying after {retry_after} seconds")
+                    self.rate_limited(chat_id, retry_after)  # The retry waits for the chat's rate budget
+                    return await self.send_message(session, message, message_type, reply_to_message_id, chat_id)  # Recursively retry sending the message
                 else:
-                    self.logger.error(f"Error sending Telegram message: {html_message} /// Response: {response_data}")
+                    self.logger.error(f"Error sending Telegram message to chat {chat_id}: {html_message} /// Response: {response_data}")
                     return None
         except Exception as e:
-            self.logger.error(f"Error sending Telegram message: {html_message} /// Exception: {e}")
+            self.logger.error(f"Error sending Telegram message to chat {chat_id}: {html_message} /// Exception: {e}")
             return None
+
+    async def edit_message(self, session, message_id, message, message_type="ALERT", chat_id=None):
+        chat_id = chat_id or self.chat_id
+        html_message = message
+        try:
+            await self.wait_for_rate_budget(chat_id)
+            html_message = self.format_message(message, message_type)
+            encoded_message = urllib.parse.quote(html_message)
+
+            edit_text = f'https://api.telegram.org/bot{self.bot_token}/editMessageText?chat_id={chat_id}&message_id={message_id}&parse_mode=HTML&text={encoded_message}'
+
+            async with session.get(edit_text) as response:
+                response_data = await response.json()
+                if response_data.get("ok"):
+                    return True
+                elif "message is not modified" in response_data.get("description", ""):
+                    # The message already shows this text
+                    return True
+                elif response_data.get("error_code") == 429:
+                    retry_after = response_data.get("parameters", {}).get("retry_after", 60)
+                    self.logger.info(f"Rate limit hit for chat {chat_id}, retrying edit after {retry_after} seconds")
+                    self.rate_limited(chat_id, retry_after)
+                    return await self.edit_message(session, message_id, message, message_type, chat_id)
+                else:
+                    self.logger.error(f"Error editing Telegram message {message_id}: {html_message} /// Response: {response_data}")
+                    return False
+        except Exception as e:
+            self.logger.error(f"Error editing Telegram message {message_id}: {html_message} /// Exception: {e}")
+            return False
         
-    async def send_graph_image(self, session, file_name, reply_to_message_id):
+    def delete_image(self, file_name):
+        file_path = os.path.join(self.image_directory, file_name)
+        try:
+            os.remove(file_path)
+            self.logger.info(f"Deleted file: {file_name}")
+        except OSError as e:
+            self.logger.error(f"Error deleting file {file_name}: {e}")
+
+    async def send_graph_image(self, session, file_name, reply_to_message_id, chat_id=None, delete_file=True):
+        chat_id = chat_id or self.chat_id
         file_path = os.path.join(self.image_directory, file_name)
 
         try:
+            await self.wait_for_rate_budget(chat_id)
             with open(file_path, 'rb') as file:
                 data = aiohttp.FormData()
-                data.add_field('chat_id', self.chat_id)
+                data.add_field('chat_id', chat_id)
                 data.add_field('photo', file, filename=file_name)
                 data.add_field('reply_to_message_id', str(reply_to_message_id))
 
                 async with session.post(f'https://api.telegram.org/bot{self.bot_token}/sendPhoto', data=data) as response:
                     if response.status == 200:
-                        # Successfully sent the image, now delete it
-                        try:
-                            os.remove(file_path)
-                            self.logger.info(f"Deleted file: {file_name}")
-                        except OSError as e:
-                            self.logger.error(f"Error deleting file {file_name}: {e}")
+                        # Successfully sent the image, now delete it unless it is uploaded to more chats
+                        if delete_file:
+                            self.delete_image(file_name)
                         return True
                     else:
                         self.logger.error(f"Failed to send image. Status: {response.status}")
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_stream import JsonRpcStream
+
+
+def parse_in_chunks(text, size):
+    parser = JsonRpcStream()
+    data = text.encode()
+    elements = []
+    for start in range(0, len(data), size):
+        elements.extend(parser.feed(data[start:start + size]))
+    elements.extend(parser.close())
+    return elements, parser.envelope
+
+
+class JsonRpcStreamTest(unittest.TestCase):
+    def test_every_chunk_boundary(self):
+        result = [{"triggerid": "1", "description": "Disk über 90%"}, 1.5e3, -2, 0.25, 7, True, None, "x", [1, 2]]
+        text = json.dumps({"jsonrpc": "2.0", "result": result, "id": 3})
+        for size in range(1, len(text) + 1):
+            elements, envelope = parse_in_chunks(text, size)
+            self.assertEqual(elements, result, f"chunk size {size}")
+            self.assertEqual(envelope, {"jsonrpc": "2.0", "id": 3})
+
+    def test_number_split_after_dot_or_exponent(self):
+        for first, second in (("[1.", "5e3]"), ("[1", ".5e3]"), ("[1.5e", "3]"), ("[1.5e+", "3]"), ("[-", "2]")):
+            parser = JsonRpcStream()
+            elements = parser.feed(b'{"result": ' + first.encode())
+            elements += parser.feed(second.encode() + b"}")
+            elements += parser.close()
+            self.assertEqual(elements, json.loads(first + second))
+
+    def test_truncated_response(self):
+        parser = JsonRpcStream()
+        parser.feed(b'{"result": [{"triggerid": "1"}, {"trig')
+        with self.assertRaises(ValueError):
+            parser.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from traffic_trace import TraceRequest, TraceResponse
+from zabbix_client import ZabbixClient
+
+
+class FakeTriggerApi:
+    # trigger.get with the documented strict lastChangeSince / lastChangeTill bounds
+    def __init__(self, triggers):
+        self.triggers = triggers
+        self.requests = []
+
+    def post(self, url, **kwargs):
+        params = kwargs["json"]["params"]
+        self.requests.append(params)
+
+        async def handler():
+            result = [trigger for trigger in self.triggers
+                      if int(trigger["lastchange"]) > params.get("lastChangeSince", 0)
+                      and ("lastChangeTill" not in params or int(trigger["lastchange"]) < params["lastChangeTill"])]
+            result.sort(key=lambda trigger: int(trigger["lastchange"]), reverse=True)
+            if params.get("limit"):
+                result = result[:params["limit"]]
+            return TraceResponse(200, json.dumps({"jsonrpc": "2.0", "result": result, "id": 3}).encode())
+
+        return TraceRequest(handler)
+
+
+def make_triggers(seconds, per_second, start=1000):
+    return [{"triggerid": str(second * 100 + index), "description": f"Trigger {second}/{index}", "priority": "4",
+             "lastchange": str(start + second), "value": "1", "hosts": [{"host": "host", "hostid": "1"}]}
+            for second in range(seconds) for index in range(per_second)]
+
+
+def make_client(page_size):
+    return ZabbixClient("http://zabbix/api_jsonrpc.php", "user", "password", None, 1, 0, 30, False, 1, [], 999, 3600, 0, 1,
+                        None, None, False, None, None, False, 0, trigger_page_size=page_size)
+
+
+async def collect(client, session, **kwargs):
+    triggers = []
+    async for batch in client.iter_triggers(session, "1", **kwargs):
+        triggers.extend(batch)
+    return triggers
+
+
+class IterTriggersPagingTest(unittest.TestCase):
+    def fetch(self, triggers, page_size, **kwargs):
+        session = FakeTriggerApi(triggers)
+        return asyncio.run(collect(make_client(page_size), session, **kwargs)), session
+
+    def test_pages_keep_triggers_at_the_boundary_second(self):
+        triggers = make_triggers(seconds=11, per_second=5)
+        result, session = self.fetch(triggers, page_size=7)
+        self.assertEqual(sorted(trigger["triggerid"] for trigger in result), sorted(trigger["triggerid"] for trigger in triggers))
+        self.assertGreater(len(session.requests), 1)
+
+    def test_second_larger_than_a_page_is_fetched_completely(self):
+        triggers = make_triggers(seconds=3, per_second=10)
+        result, session = self.fetch(triggers, page_size=4)
+        self.assertEqual(len(result), len(triggers))
+        self.assertEqual(len({trigger["triggerid"] for trigger in result}), len(triggers))
+        single_second = [params for params in session.requests if "limit" not in params]
+        self.assertTrue(single_second)
+        for params in single_second:
+            self.assertEqual(params["lastChangeTill"] - params["lastChangeSince"], 2)
+
+    def test_lower_bound_is_respected(self):
+        triggers = make_triggers(seconds=6, per_second=3)
+        result, _ = self.fetch(triggers, page_size=2, changed_since=1002)
+        self.assertEqual(sorted(trigger["triggerid"] for trigger in result),
+                         sorted(trigger["triggerid"] for trigger in triggers if int(trigger["lastchange"]) > 1002))
+
+    def test_unpaged_request(self):
+        triggers = make_triggers(seconds=4, per_second=3)
+        result, session = self.fetch(triggers, page_size=0)
+        self.assertEqual(len(result), len(triggers))
+        self.assertEqual(len(session.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import time
+from collections import defaultdict, deque
+
+REDACTED = "REDACTED"
+
+
+class TraceContent:
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+class TraceResponse:
+    # Minimal stand-in for an aiohttp response, only what the clients use
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        self.content = TraceContent(body)
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def read(self):
+        return self.body
+
+
+class TraceRequest:
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def __aenter__(self):
+        return await self.handler()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class TraceRecorder:
+    def __init__(self, trace_file, logger=None):
+        self.trace_file = trace_file
+        self.logger = logger if logger else logging.getLogger(__name__)
+        # Every run appends a new gzip member, gzip readers see them as one stream
+        self.file = gzip.open(trace_file, "at", encoding="utf-8")
+        self.started_at = time.monotonic()
+        self.logger.info(f"Recording Zabbix traffic to {trace_file}.")
+
+    # Methods whose parameters and results are credentials as a whole
+    SECRET_METHODS = ("user.login", "user.checkAuthentication")
+    # Keys that carry credentials anywhere in a request or response
+    SECRET_KEYS = ("auth", "password", "sessionid", "session_id", "token", "secret")
+
+    def redact_keys(self, value):
+        if isinstance(value, dict):
+            return {key: REDACTED if key.lower() in self.SECRET_KEYS else self.redact_keys(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.redact_keys(item) for item in value]
+        return value
+
+    def redact_request(self, payload):
+        # redact_keys returns a copy, the payload that is sent is not modified
+        payload = self.redact_keys(payload)
+        if payload.get("method") in self.SECRET_METHODS:
+            payload["params"] = {key: REDACTED for key in payload.get("params", {})}
+        return payload
+
+    def redact_response(self, method, response_data):
+        if method in self.SECRET_METHODS and "result" in response_data:
+            response_data = dict(response_data, result=REDACTED)
+        return self.redact_keys(response_data)
+
+    def write(self, entry):
+        entry["t"] = round(time.monotonic() - self.started_at, 6)
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def record_api(self, payload, status, body, duration):
+        method = payload.get("method")
+        try:
+            response_data = self.redact_response(method, json.loads(body))
+        except ValueError:
+            response_data = None
+        self.write({
+            "kind": "api",
+            "method": method,
+            "request": self.redact_request(payload),
+            "status": status,
+            "response": response_data,
+            "duration": round(duration, 6)
+        })
+
+    def record_chart(self, url, status, body, duration):
+        # Only the query string is kept, cookies are never recorded
+        self.write({
+            "kind": "chart",
+            "request": url.split("?", 1)[-1],
+            "status": status,
+            "body": base64.b64encode(body).decode("ascii"),
+            "duration": round(duration, 6)
+        })
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingSession:
+    def __init__(self, session, recorder, api_url):
+        self.session = session
+        self.recorder = recorder
+        self.api_url = api_url
+
+    def post(self, url, **kwargs):
+        if url != self.api_url:
+            return self.session.post(url, **kwargs)
+
+        async def handler():
+            started = time.monotonic()
+            async with self.session.post(url, **kwargs) as response:
+                status = response.status
+                body = await response.read()
+            self.recorder.record_api(kwargs.get("json", {}), status, body, time.monotonic() - started)
+            return TraceResponse(status, body)
+
+        return TraceRequest(handler)
+
+    def get(self, url, **kwargs):
+        if "/chart.php" not in url:
+            return self.session.get(url, **kwargs)
+
+        async def handler():
+            started = time.monotonic()
+            async with self.session.get(url, **kwargs) as response:
+                status = response.status
+                body = await response.read()
+            self.recorder.record_chart(url, status, body, time.monotonic() - started)
+            return TraceResponse(status, body)
+
+        return TraceRequest(handler)
+
+
+class ReplaySession:
+    # Serves a recorded trace to the unmodified clients; Telegram requests are answered locally
+    replaying = True
+
+    def __init__(self, trace_file, api_url, speed=1.0, logger=None):
+        self.api_url = api_url
+        self.speed = speed
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.responses = defaultdict(deque)
+        self.message_id = 0
+        self.started_at = time.monotonic()
+
+        entry_count = 0
+        # Every recorded run starts its "t" at 0, the runs are replayed one after the other
+        run_offset = 0.0
+        previous_t = 0.0
+        timeline_end = 0.0
+        try:
+            with gzip.open(trace_file, "rt", encoding="utf-8") as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if entry["t"] < previous_t:
+                        run_offset = timeline_end
+                    previous_t = entry["t"]
+                    entry["at"] = run_offset + entry["t"]
+                    timeline_end = entry["at"]
+                    key = entry["method"] if entry["kind"] == "api" else "chart"
+                    self.responses[key].append(entry)
+                    entry_count += 1
+        except (EOFError, ValueError):
+            # A recording killed mid-write has a truncated last member, keep what was read
+            self.logger.warning(f"Replay trace {trace_file} is truncated, using the first {entry_count} requests.")
+        self.logger.info(f"Replaying {entry_count} recorded requests from {trace_file} at speed {speed}.")
+
+    async def delay(self, entry):
+        # Answer at the recorded point of the timeline, scaled by the replay speed (0 means no delay).
+        # A replay that runs behind the recording is not slowed down further
+        if self.speed > 0:
+            remaining = self.started_at + entry["at"] / self.speed - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    async def sleep(self, seconds):
+        # The app's own waits (MAIN_LOOP_SLEEP_DURATION...) run at the replay speed too
+        await asyncio.sleep(seconds / self.speed if self.speed > 0 else seconds)
+
+    def post(self, url, **kwargs):
+        if url != self.api_url:
+            return TraceRequest(self.telegram_response)
+
+        async def handler():
+            method = kwargs.get("json", {}).get("method")
+            if not self.responses[method]:
+                self.logger.warning(f"Replay trace has no more responses for {method}.")
+                body = json.dumps({"jsonrpc": "2.0", "error": {"code": -32500, "message": "Replay trace exhausted", "data": method}, "id": 1})
+                return TraceResponse(200, body.encode())
+            entry = self.responses[method].popleft()
+            await self.delay(entry)
+            return TraceResponse(entry["status"], json.dumps(entry["response"]).encode())
+
+        return TraceRequest(handler)
+
+    def get(self, url, **kwargs):
+        if "/chart.php" not in url:
+            return TraceRequest(self.telegram_response)
+
+        async def handler():
+            if not self.responses["chart"]:
+                self.logger.warning("Replay trace has no more chart.php responses.")
+                return TraceResponse(404, b"")
+            entry = self.responses["chart"].popleft()
+            await self.delay(entry)
+            return TraceResponse(entry["status"], base64.b64decode(entry["body"]))
+
+        return TraceRequest(handler)
+
+    async def telegram_response(self):
+        self.message_id += 1
+        return TraceResponse(200, json.dumps({"ok": True, "result": {"message_id": self.message_id}}).encode())
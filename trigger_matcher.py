@@ -0,0 +1,98 @@
+import re
+
+class TriggerMatcher:
+    # Zabbix macros such as {HOST.NAME}, {ITEM.LASTVALUE1} or {$USER.MACRO}
+    MACRO_PATTERN = re.compile(r'\{\$?[A-Z0-9_.]+(?::[^}]*)?\}')
+
+    def __init__(self, trigger_filters):
+        self.trigger_filters = trigger_filters
+        self.exact_descriptions = {}
+        self.wildcard_filters = []
+        self.forward_pattern = None
+        self.reverse_pattern = None
+        self.infix_pattern = None
+        self.compile()
+
+    def compile(self):
+        forward_trie = {}
+        reverse_trie = {}
+        infix_trie = {}
+        for trigger_filter in self.trigger_filters:
+            description = trigger_filter["description"]
+            if self.MACRO_PATTERN.search(description) is None:
+                # Macro-free filters are a plain dictionary lookup
+                self.exact_descriptions.setdefault(description, trigger_filter)
+                continue
+
+            # Each macro becomes a wildcard, the literal text around it must match exactly
+            parts = self.MACRO_PATTERN.split(description)
+            group_name = f"f{len(self.wildcard_filters)}"
+            self.wildcard_filters.append(trigger_filter)
+            if parts[0]:
+                self.add_to_trie(forward_trie, parts, group_name)
+            elif parts[-1]:
+                # Filters starting with a macro are matched against the reversed description,
+                # so they are anchored on a literal prefix as well
+                self.add_to_trie(reverse_trie, [part[::-1] for part in reversed(parts)], group_name)
+            else:
+                # Macros at both ends: no anchor in either direction. All of these share one
+                # trie of their first literal behind a single leading wildcard, so the description
+                # is scanned once for all of them instead of once per filter
+                self.add_to_trie(infix_trie, parts[1:], group_name)
+
+        if forward_trie:
+            self.forward_pattern = re.compile(self.trie_to_regex(forward_trie), re.DOTALL)
+        if reverse_trie:
+            self.reverse_pattern = re.compile(self.trie_to_regex(reverse_trie), re.DOTALL)
+        if infix_trie:
+            self.infix_pattern = re.compile(".+?" + self.trie_to_regex(infix_trie), re.DOTALL)
+
+    def add_to_trie(self, trie, parts, group_name):
+        # The literal prefix is stored character by character, the remainder of the filter
+        # hangs off the node where the prefix ends
+        node = trie
+        for char in parts[0]:
+            node = node.setdefault(char, {})
+        rest = "".join(".+?" + re.escape(part) for part in parts[1:])
+        node.setdefault(None, []).append(f"(?P<{group_name}>){rest}")
+
+    def trie_to_regex(self, node):
+        # Shared prefixes are emitted once, so the regex engine walks each description a
+        # single time instead of retrying every filter from the start
+        alternatives = list(node.get(None, []))
+        for char, child in node.items():
+            if char is None:
+                continue
+            literal = char
+            while len(child) == 1 and None not in child:
+                next_char, child = next(iter(child.items()))
+                literal += next_char
+            alternatives.append(re.escape(literal) + self.trie_to_regex(child))
+
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    def match(self, description):
+        trigger_filter = self.exact_descriptions.get(description)
+        if trigger_filter is not None:
+            return trigger_filter
+
+        if self.forward_pattern is not None:
+            match = self.forward_pattern.fullmatch(description)
+            if match is not None:
+                return self.wildcard_filters[int(match.lastgroup[1:])]
+        if self.reverse_pattern is not None:
+            match = self.reverse_pattern.fullmatch(description[::-1])
+            if match is not None:
+                return self.wildcard_filters[int(match.lastgroup[1:])]
+        if self.infix_pattern is not None:
+            match = self.infix_pattern.fullmatch(description)
+            if match is not None:
+                return self.wildcard_filters[int(match.lastgroup[1:])]
+        return None
+
+    def filter_triggers(self, triggers):
+        for trigger in triggers:
+            if self.match(trigger['description']) is not None:
+                yield trigger
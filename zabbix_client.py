@@ -1,20 +1,20 @@
 import asyncio
+import base64
+import json
 import logging
 import os
 import time
-from httpcore import TimeoutException
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.chrome.service import Service
+import urllib.parse
+from trigger_matcher import TriggerMatcher
+from json_stream import JsonRpcStream
 
 class ZabbixClient:
+    # Read size of streamed API responses
+    STREAM_CHUNK_SIZE = 65536
+
     def __init__(self, api_url, user, password, telegram_client, max_login_retries, login_retry_delay, cleanup_interval, use_trigger_filters, 
                  main_loop_sleep_duration, trigger_filters, script_start_time, retention_period, min_severity, login_retry_interval, login_url, 
-                 graph_manager, send_graphs, executable_path, binary_location, use_duration_threshold , duration_threshold ,logger=None):
+                 graph_manager, send_graphs, executable_path, binary_location, use_duration_threshold , duration_threshold , single_query_filters=False, startup_time_target=60, trigger_page_size=1000, logger=None):
         self.api_url = api_url
         self.user = user
         self.password = password
@@ -28,6 +28,8 @@ class ZabbixClient:
         self.main_loop_sleep_duration = main_loop_sleep_duration
         self.use_trigger_filters = use_trigger_filters
         self.trigger_filters = trigger_filters
+        self.trigger_matcher = TriggerMatcher(trigger_filters)
+        self.single_query_filters = single_query_filters
         self.script_start_time = script_start_time
         self.retention_period = retention_period
         self.min_severity = min_severity
@@ -39,24 +41,42 @@ class ZabbixClient:
         self.binary_location = binary_location
         self.use_duration_threshold = use_duration_threshold
         self.duration_threshold = duration_threshold
-
+        self.config_reloader = None
+        self.startup_time_target = startup_time_target
+        self.trigger_page_size = trigger_page_size
+        self.startup_started_at = script_start_time
+        self.startup_completed = False
+        self.host_ips = {}
+        self.host_ips_cleared_at = time.time()
+        self.diagnostics = None
+        # Extra trigger.get selects, set from the routing rules
+        self.trigger_selects = {}
+        # Set in HA mode, only the lease holder sends alarms
+        self.leader_lease = None
+
+    def is_standby(self):
+        # Status messages are only sent by the active instance, a standby logs them
+        return self.leader_lease is not None and not self.leader_lease.is_leader
+
+    def set_trigger_filters(self, trigger_filters):
+        self.trigger_filters = trigger_filters
+        self.trigger_matcher = TriggerMatcher(trigger_filters)
            
         
     async def login(self, session):
- 
-        if self.send_graphs:
-            info_message = "Attempting web login..."
-            self.logger.info(info_message)
-            await self.telegram_client.send_message(session, info_message, message_type="INFO")
-            session_cookie = await self.web_login(session, self.user, self.password)
+        if self.send_graphs and self.graph_manager.needs_web_session():
+            # The browser login runs in a thread, so both logins proceed at the same time
+            token, session_cookie = await asyncio.gather(self.api_login(session), self.web_login(session, self.user, self.password))
             self.graph_manager.set_session_cookie(session_cookie)
+            return token
+
+        return await self.api_login(session)
 
-                
+    async def api_login(self, session):
         attempt_count = 0
 
         while attempt_count < self.max_login_retries:
             self.logger.info(f"Attempt {attempt_count + 1} to login to Zabbix API.")
-            await self.telegram_client.send_message(session, "Attempting to login to Zabbix API...", message_type="INFO")
 
             headers = {"Content-Type": "application/json-rpc"}
             payload = {
@@ -74,7 +94,8 @@ class ZabbixClient:
                         token = response_data["result"]
                         success_message = "Successfully logged in to Zabbix API."
                         self.logger.info(success_message)
-                        await self.telegram_client.send_message(session, success_message, message_type="INFO")
+                        if not self.is_standby():
+                            await self.telegram_client.send_message(session, success_message, message_type="INFO")
                         return token
 
                     else:
@@ -96,7 +117,69 @@ class ZabbixClient:
         await self.telegram_client.send_message(session, "Failed to login to Zabbix after maximum retry attempts.", message_type="ERROR")
         return None
 
+    async def get_host_ips(self, session, host_ids):
+        # Resolve the IPs of many hosts with one request, results are cached until the next cleanup
+        missing_ids = sorted({host_id for host_id in host_ids if host_id not in self.host_ips})
+        if not missing_ids:
+            return
+
+        headers = {"Content-Type": "application/json-rpc"}
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "hostinterface.get",
+            "params": {
+                "output": ["ip", "hostid"],
+                "hostids": missing_ids,
+                "filter": {"type": 1}
+            },
+            "auth": self.token,
+            "id": 2
+        }
+
+        try:
+            async with session.post(self.api_url, headers=headers, json=payload) as response:
+                response_data = await response.json()
+        except Exception as e:
+            self.logger.error(f"Exception occurred while fetching IPs for {len(missing_ids)} hosts: {e}")
+            return
+
+        if "error" in response_data:
+            self.logger.error(f"Error fetching IPs for {len(missing_ids)} hosts: {response_data['error']}")
+            return
+
+        for interface in response_data.get("result", []):
+            self.host_ips.setdefault(interface.get("hostid"), interface.get("ip", "N/A"))
+        for host_id in missing_ids:
+            # Hosts without an agent interface are cached too, they are not asked for again
+            self.host_ips.setdefault(host_id, "N/A")
+        self.logger.info(f"Fetched IPs for {len(missing_ids)} hosts in bulk.")
+
+    async def prefetch_host_ips(self, session, triggers, trigger_state=None):
+        # With a trigger state only the triggers that will produce a message need their host IP
+        if trigger_state is not None:
+            triggers = [trigger for trigger in triggers if self.alarm_manager.will_send(trigger, trigger_state)]
+        host_ids = [trigger['hosts'][0]['hostid'] for trigger in triggers if trigger.get('hosts') and 'hostid' in trigger['hosts'][0]]
+        await self.get_host_ips(session, host_ids)
+
+    async def sleep(self, session, seconds):
+        # A replayed trace runs the waits between cycles at the replay speed as well
+        if getattr(session, "replaying", False):
+            await session.sleep(seconds)
+        else:
+            await asyncio.sleep(seconds)
+
+    def report_startup_time(self):
+        self.startup_completed = True
+        startup_time = time.time() - self.startup_started_at
+        if self.startup_time_target and startup_time > self.startup_time_target:
+            self.logger.warning(f"Startup took {startup_time:.1f} seconds, above the {self.startup_time_target} seconds target.")
+        else:
+            self.logger.info(f"Startup completed in {startup_time:.1f} seconds.")
+
     async def get_host_ip_by_id(self, session, host_id):
+        if host_id in self.host_ips:
+            return self.host_ips[host_id]
+
         self.logger.info(f"Fetching IP for host ID: {host_id}")
 
         # API endpoint and request setup
@@ -123,11 +206,12 @@ class ZabbixClient:
                 if "result" in response_data and isinstance(response_data["result"], list):
                     if response_data["result"]:
                         host_ip = response_data["result"][0].get("ip", "N/A")
+                        self.host_ips[host_id] = host_ip
                         self.logger.info(f"Fetched IP for host ID {host_id}")
                         return host_ip
                     else:
                         self.logger.warning(f"No IP address found for host ID {host_id}.")
-                        await self.telegram_client.send_message(f"No IP address found for host ID {host_id}.")
+                        self.host_ips[host_id] = "N/A"
                         return "N/A"
                 else:
                     if "error" in response_data:
@@ -191,39 +275,64 @@ class ZabbixClient:
     async def fetch_and_distribute_triggers(self, session,trigger_filter=None):
 
         while True:
+            if self.config_reloader:
+                # Swap in reloaded settings between cycles, never in the middle of one
+                await self.config_reloader(session)
+
+            if self.diagnostics:
+                self.diagnostics.cycle_started()
+
             current_time = time.time()
             if current_time - self.last_cleanup_time > self.cleanup_interval:
                 self.alarm_manager.cleanup_sent_alarms(self.retention_period)
                 self.last_cleanup_time = current_time
+            if current_time - self.host_ips_cleared_at > self.retention_period:
+                # Host IPs rarely change, the cache is refreshed once per RETENTION_PERIOD
+                self.host_ips.clear()
+                self.host_ips_cleared_at = current_time
 
             if self.token is None:
                 self.token = await self.login(session)
                 self.graph_manager.set_token(self.token)
                 if self.token is None:
-                    await asyncio.sleep(self.login_retry_interval)
+                    await self.sleep(session, self.login_retry_interval)
                     continue
 
+            if not self.startup_completed:
+                # The host IPs of the first cycle are fetched in bulk per page by distribute_triggers
+                self.report_startup_time()
+
+            if self.leader_lease and not self.leader_lease.is_leader:
+                await self.standby_cycle(session)
+                if self.diagnostics:
+                    self.diagnostics.cycle_finished()
+                continue
+
             try:
-                if self.use_trigger_filters:
+                if self.use_trigger_filters and self.single_query_filters:
+                    # One query per state for all filters, matched locally
+                    self.logger.info("////////////////////////////////////////////////////////////")
+                    problem_triggers = self.iter_filtered_triggers(session, "1", use_duration_threshold=self.use_duration_threshold, duration_threshold=self.duration_threshold)
+                    await self.distribute_triggers(session, problem_triggers, "1", current_time)
+
+                    resolved_triggers = self.iter_filtered_triggers(session, "0")
+                    await self.distribute_triggers(session, resolved_triggers, "0", current_time)
+                elif self.use_trigger_filters:
                     for trigger_filter in self.trigger_filters:
                         self.logger.info("////////////////////////////////////////////////////////////")
-                        problem_triggers = await self.fetch_triggers(session, "1", trigger_filter, use_duration_threshold=self.use_duration_threshold, duration_threshold=self.duration_threshold)
-                        for trigger in problem_triggers:
-                            await self.alarm_manager.process_problem_trigger(session, trigger, current_time)
+                        problem_triggers = self.iter_triggers(session, "1", trigger_filter, use_duration_threshold=self.use_duration_threshold, duration_threshold=self.duration_threshold)
+                        await self.distribute_triggers(session, problem_triggers, "1", current_time)
 
-                        resolved_triggers = await self.fetch_triggers(session, "0", trigger_filter)
-                        for trigger in resolved_triggers:
-                            await self.alarm_manager.process_resolved_trigger(session, trigger, current_time)
+                        resolved_triggers = self.iter_triggers(session, "0", trigger_filter)
+                        await self.distribute_triggers(session, resolved_triggers, "0", current_time)
                 else:
                     #Fetch all triggers without filter but severity
                     self.logger.info("////////////////////////////////////////////////////////////")
-                    problem_triggers = await self.fetch_triggers(session, "1", min_severity=self.min_severity, use_duration_threshold=self.use_duration_threshold, duration_threshold=self.duration_threshold)
-                    for trigger in problem_triggers:
-                        await self.alarm_manager.process_problem_trigger(session, trigger, current_time)
+                    problem_triggers = self.iter_triggers(session, "1", min_severity=self.min_severity, use_duration_threshold=self.use_duration_threshold, duration_threshold=self.duration_threshold)
+                    await self.distribute_triggers(session, problem_triggers, "1", current_time)
 
-                    resolved_triggers = await self.fetch_triggers(session, "0", min_severity=self.min_severity)
-                    for trigger in resolved_triggers:
-                        await self.alarm_manager.process_resolved_trigger(session, trigger, current_time)
+                    resolved_triggers = self.iter_triggers(session, "0", min_severity=self.min_severity)
+                    await self.distribute_triggers(session, resolved_triggers, "0", current_time)
                                         
 
             except Exception as e:
@@ -232,40 +341,144 @@ class ZabbixClient:
                 await self.telegram_client.send_message(session, error_message, message_type="ERROR")
 
                 self.logger.info(f"Sleeping for {self.main_loop_sleep_duration} seconds after error...")
-                await asyncio.sleep(self.main_loop_sleep_duration)
+                await self.sleep(session, self.main_loop_sleep_duration)
+
+            if self.alarm_manager.edit_in_place:
+                await self.alarm_manager.flush_status_edits(session, time.time())
+
+            if self.leader_lease and self.leader_lease.is_leader:
+                # Handed to the standby when it takes over, so it does not alert open problems again
+                self.leader_lease.save_state("sent_alarms", self.alarm_manager.sent_alarms)
 
             self.logger.info("////////////////////////////////////////////////////////////")  
+            if self.alarm_manager.outbox:
+                self.logger.info(f"Outbox: {self.alarm_manager.outbox.pending_count()} messages waiting for delivery.")
+            if self.send_graphs and self.alarm_manager.graph_worker_pool:
+                self.logger.info(self.alarm_manager.graph_worker_pool.format_stats())
+            if self.diagnostics:
+                self.diagnostics.cycle_finished()
             self.logger.info("---------------------------------------------------------------------")
             self.logger.info(f"Cycle completed, sleeping for {self.main_loop_sleep_duration} seconds...")
             self.logger.info("---------------------------------------------------------------------")
-            await asyncio.sleep(self.main_loop_sleep_duration)
-
+            await self.sleep(session, self.main_loop_sleep_duration)
+
+
+    async def standby_cycle(self, session):
+        # The standby stays logged in and follows the alarm state of the active instance, so a
+        # takeover needs neither a browser login nor new alerts for known problems
+        if not await self.keep_session_alive(session):
+            self.token = None
+        self.alarm_manager.restore_state(self.leader_lease.load_state("sent_alarms", {}))
+        self.logger.info(f"Standby with {len(self.alarm_manager.sent_alarms)} known alarms, active instance is {self.leader_lease.get_holder()}.")
+        await self.leader_lease.wait_for_leadership(self.main_loop_sleep_duration)
+
+    async def keep_session_alive(self, session):
+        # user.checkAuthentication extends the session it checks. The web session behind the
+        # zbx_session cookie (base64 JSON with its own sessionid) is checked as well.
+        session_ids = [self.token]
+        session_cookie = self.graph_manager.get_session_cookie() if self.send_graphs and self.graph_manager.needs_web_session() else None
+        if isinstance(session_cookie, str):
+            try:
+                session_ids.append(json.loads(base64.b64decode(urllib.parse.unquote(session_cookie)))["sessionid"])
+            except (ValueError, KeyError, TypeError):
+                pass
 
-    async def fetch_triggers(self, session, trigger_state, trigger_filter=None, min_severity=None, use_duration_threshold=None, duration_threshold=None):
+        headers = {"Content-Type": "application/json-rpc"}
+        for session_id in session_ids:
+            payload = {
+                "jsonrpc": "2.0",
+                "method": "user.checkAuthentication",
+                "params": {"sessionid": session_id},
+                "id": 1
+            }
+            try:
+                async with session.post(self.api_url, headers=headers, json=payload) as response:
+                    response_data = await response.json()
+            except Exception as e:
+                self.logger.error(f"Error checking Zabbix session: {e}")
+                return False
+            if "error" in response_data:
+                self.logger.warning(f"Zabbix session expired, logging in again: {response_data['error']}")
+                return False
+        return True
+
+    async def distribute_triggers(self, session, trigger_batches, trigger_state, current_time):
+        # Each batch is handed over as soon as it is parsed, the rest of the result is still downloading
+        process_trigger = self.alarm_manager.process_problem_trigger if trigger_state == "1" else self.alarm_manager.process_resolved_trigger
+        async for triggers in trigger_batches:
+            if self.leader_lease and not self.leader_lease.is_leader:
+                self.logger.warning("Lease lost during the cycle, leaving the remaining triggers to the active instance.")
+                await trigger_batches.aclose()
+                return
+            await self.prefetch_host_ips(session, triggers, trigger_state)
+            for trigger in triggers:
+                await process_trigger(session, trigger, current_time)
+
+    async def iter_filtered_triggers(self, session, trigger_state, use_duration_threshold=None, duration_threshold=None):
         fetching_type = "PROBLEM" if trigger_state == "1" else "RESOLVED"
+
+        # Stream the union of all filters once with unexpanded descriptions, which is what the
+        # per-filter "description" query compared against, and match them locally
+        matched_ids = []
+        candidate_count = 0
+        async for candidates in self.iter_triggers(session, trigger_state, min_severity=self.min_severity, use_duration_threshold=use_duration_threshold,
+                                                   duration_threshold=duration_threshold, expand_description=False):
+            candidate_count += len(candidates)
+            matched_ids.extend(trigger['triggerid'] for trigger in self.trigger_matcher.filter_triggers(candidates))
+        self.logger.info(f"Matched {len(matched_ids)} of {candidate_count} {fetching_type} triggers against {len(self.trigger_filters)} filters.")
+        if not matched_ids:
+            return
+
+        # Only the matched triggers are fetched again with expanded descriptions for the messages
+        async for triggers in self.iter_triggers(session, trigger_state, trigger_ids=matched_ids):
+            yield triggers
+
+    async def stream_api_result(self, session, payload, parser):
+        # The response is parsed while it downloads, but the batches are only handed out once
+        # it is complete: processing them (Telegram sends, rate limits) must not keep the
+        # connection open or count against the request timeout. A page is bounded by TRIGGER_PAGE_SIZE.
         headers = {"Content-Type": "application/json-rpc"}
+        batches = []
+        async with session.post(self.api_url, headers=headers, json=payload) as response:
+            async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                elements = parser.feed(chunk)
+                if elements:
+                    batches.append(elements)
+        elements = parser.close()
+        if elements:
+            batches.append(elements)
+        for elements in batches:
+            yield elements
+
+    async def iter_triggers(self, session, trigger_state, trigger_filter=None, min_severity=None, use_duration_threshold=None, duration_threshold=None,
+                            expand_description=True, trigger_ids=None, changed_since=None):
+        fetching_type = "PROBLEM" if trigger_state == "1" else "RESOLVED"
         
         MAX_SEVERITY_LEVEL = 5
 
         # Base parameters for the payload
         params = {
-            "output": ["description", "priority", "triggerid", "lastchange"],
-            "expandDescription": 1,
+            "output": ["description", "priority", "triggerid", "lastchange", "value"],
+            "expandDescription": 1 if expand_description else 0,
             "selectHosts": ["host", "hostid"],
             "sortfield": "lastchange",
             "sortorder": "DESC",
-            "lastChangeSince": int(self.script_start_time),
+            "lastChangeSince": int(self.script_start_time if changed_since is None else changed_since),
             "monitored": True,
             "active": True,
             "filter": {"value": trigger_state}
         }
+        # Host groups and tags for the routing rules
+        params.update(self.trigger_selects)
 
         if use_duration_threshold:
             threshold = int(time.time()) - (duration_threshold * 60) 
             params["lastChangeTill"] = threshold  
 
-        # Apply trigger_filter or min_severity
-        if trigger_filter is not None:
+        # Apply trigger_ids, trigger_filter or min_severity
+        if trigger_ids is not None:
+            params["triggerids"] = trigger_ids
+        elif trigger_filter is not None:
             params["filter"].update(trigger_filter)
         elif min_severity is not None:
             if min_severity > MAX_SEVERITY_LEVEL:
@@ -274,36 +487,122 @@ class ZabbixClient:
             severity_range = list(range(min_severity, MAX_SEVERITY_LEVEL + 1))
             params["filter"]["priority"] = severity_range
 
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "trigger.get",
-            "params": params,
-            "auth": self.token,
-            "id": 3
-        }
+        # Pages follow the lastchange DESC order. lastChangeSince/lastChangeTill are strict bounds,
+        # so every page continues with lastChangeTill one second above the oldest trigger of the
+        # previous one; the triggers already yielded at that second are skipped. A full page that
+        # never gets below that second is completed with one request without limit for the second.
+        page_size = self.trigger_page_size
+        till = params.get("lastChangeTill")
+        seen_ids = set()
+        single_second = False
+        trigger_count = 0
+        page_count = 0
 
-        async with session.post(self.api_url, headers=headers, json=payload) as response:
-            response_data = await response.json()
+        while True:
+            page_params = dict(params)
+            if single_second:
+                page_params["lastChangeSince"] = till - 2
+                page_params["lastChangeTill"] = till
+            else:
+                if till is not None:
+                    page_params["lastChangeTill"] = till
+                if page_size:
+                    page_params["limit"] = page_size
 
-            if "error" in response_data:
-                error_message = f"Error fetching {fetching_type} triggers from Zabbix: {response_data['error']}"
+            payload = {
+                "jsonrpc": "2.0",
+                "method": "trigger.get",
+                "params": page_params,
+                "auth": self.token,
+                "id": 3
+            }
+
+            parser = JsonRpcStream()
+            received = 0
+            page_min = None
+            page_min_ids = set()
+            async for batch in self.stream_api_result(session, payload, parser):
+                received += len(batch)
+                for trigger in batch:
+                    lastchange = int(trigger['lastchange'])
+                    if page_min is None or lastchange < page_min:
+                        page_min = lastchange
+                        page_min_ids = {trigger['triggerid']}
+                    elif lastchange == page_min:
+                        page_min_ids.add(trigger['triggerid'])
+                new_triggers = [trigger for trigger in batch if trigger['triggerid'] not in seen_ids]
+                if new_triggers:
+                    trigger_count += len(new_triggers)
+                    yield new_triggers
+            page_count += 1
+
+            if "error" in parser.envelope:
+                error_message = f"Error fetching {fetching_type} triggers from Zabbix: {parser.envelope['error']}"
                 self.logger.error(error_message)
                 await self.telegram_client.send_message(session, error_message, message_type="ERROR")
-                return []
+                return
+
+            if single_second:
+                # That second is complete, continue below it
+                single_second = False
+                till -= 1
+                seen_ids = set()
+                if till <= params["lastChangeSince"] + 1:
+                    break
+            elif not page_size or received < page_size:
+                break
+            elif till is not None and page_min == till - 1:
+                seen_ids |= page_min_ids
+                single_second = True
             else:
-                trigger_count = len(response_data['result'])
-                    
-                if trigger_filter is not None:                   
-                    self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with {trigger_filter} filter.")
-                else:
-                    if use_duration_threshold:               
-                        self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with min severity {min_severity} and min duration threshold {duration_threshold} minutes.")
-                    else:
-                        self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with min severity {min_severity}.")
-                return response_data.get("result", [])
+                till = page_min + 1
+                seen_ids = page_min_ids
+
+        pages = f" in {page_count} pages" if page_count > 1 else ""
+        if trigger_ids is not None:
+            self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix for {len(trigger_ids)} matched trigger IDs{pages}.")
+        elif trigger_filter is not None:                   
+            self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with {trigger_filter} filter{pages}.")
+        else:
+            if use_duration_threshold:               
+                self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with min severity {min_severity} and min duration threshold {duration_threshold} minutes{pages}.")
+            else:
+                self.logger.info(f"Found {trigger_count} {fetching_type} triggers from Zabbix with min severity {min_severity}{pages}.")
                  
 
     async def web_login(self, session, username, password):
+        if getattr(session, "replaying", False):
+            # Replayed chart.php responses do not need a real frontend session
+            self.logger.info("Replaying recorded traffic, skipping web login.")
+            return "replay"
+
+        info_message = "Attempting web login..."
+        self.logger.info(info_message)
+        if not self.is_standby():
+            await self.telegram_client.send_message(session, info_message, message_type="INFO")
+
+        # Selenium is blocking, keep it off the event loop
+        session_cookie, error_message = await asyncio.to_thread(self.browser_login, username, password)
+        if session_cookie:
+            info_message = "Web login successful."
+            self.logger.info(info_message)
+            if not self.is_standby():
+                await self.telegram_client.send_message(session, info_message, message_type="INFO")
+            return session_cookie
+
+        self.logger.error(error_message)
+        await self.telegram_client.send_message(session, error_message, message_type="ERROR")
+        return None
+
+    def browser_login(self, username, password):
+        # Selenium is only imported when graphs are enabled and a web login is needed
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, NoSuchElementException
+        from selenium.webdriver.chrome.service import Service
 
         chrome_options = Options()
         chrome_options.binary_location = self.binary_location  
@@ -341,33 +640,14 @@ class ZabbixClient:
             # Check if login was successful by verifying if the 'zbx_sessionid' cookie is set
             for cookie in driver.get_cookies():
                 if cookie['name'] == 'zbx_session':
-                    info_message = "Web login successful."
-                    self.logger.info(info_message)
-                    await self.telegram_client.send_message(session, info_message, message_type="INFO")
-                    return cookie['value']
+                    return cookie['value'], None
 
-            error_message = "Web login failed: 'zbx_session' cookie not found"
-            self.logger.error(error_message)
-            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
-            return None
+            return None, "Web login failed: 'zbx_session' cookie not found"
 
         except TimeoutException:
-            error_message = "Timeout occurred during web login"
-            self.logger.error(error_message)
-            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
-            return None
+            return None, "Timeout occurred during web login"
         except NoSuchElementException:
-            error_message = "Required element not found during web login"
-            self.logger.error(error_message)
-            await self.telegram_client.send_message(session, error_message, message_type="ERROR")
-            return None
+            return None, "Required element not found during web login"
         finally:
             # Close the Chrome driver
             driver.quit()
-
-        
-        
-        
-    
-
-        
\ No newline at end of file